@@ -0,0 +1,61 @@
+import math
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from Relation import Relation
+
+DEFAULT_ROW_COUNT = 1000
+
+
+class RelationStatistics:
+    def __init__(self, name: str, row_count: int, distinct_counts: "list[int]",
+                 heavy_hitters: "list[dict[str, int]]|None" = None):
+        self.name = name
+        self.row_count = row_count
+        # per column of the relation, in the order of its variables
+        self.distinct_counts = distinct_counts
+        self.heavy_hitters: "list[dict[str, int]]" = heavy_hitters if heavy_hitters else [{} for _ in distinct_counts]
+
+    def __repr__(self):
+        return f"{self.name}: {self.row_count} rows, distinct {self.distinct_counts}"
+
+
+class Catalog:
+    def __init__(self, relations: "list[RelationStatistics]|None" = None, default_row_count: int = DEFAULT_ROW_COUNT):
+        self.relations: "dict[str, RelationStatistics]" = {}
+        self.default_row_count = default_row_count
+        for stats in relations if relations else []:
+            self.add(stats)
+
+    def add(self, stats: "RelationStatistics"):
+        self.relations[stats.name] = stats
+
+    def row_count(self, rel: "Relation") -> float:
+        if rel.sources:
+            return self.view_size(rel.root_sources(), rel.free_variables)
+        stats = self.relations.get(rel.name)
+        return stats.row_count if stats else self.default_row_count
+
+    def distinct_count(self, rel: "Relation", var: str) -> float:
+        if rel.sources:
+            return min((self.distinct_count(x, var) for x in rel.root_sources() if var in x.free_variables),
+                       default=self.default_row_count)
+        stats = self.relations.get(rel.name)
+        if stats is None:
+            return self.default_row_count
+        position = rel.free_variables.index(var)
+        if position >= len(stats.distinct_counts):
+            return stats.row_count
+        return min(stats.distinct_counts[position], stats.row_count)
+
+    def view_size(self, relations: "set[Relation]|list[Relation]", variables: "set[str]|list[str]") -> float:
+        # join of the relations projected onto the variables, bounded by the domains of the variables and by the
+        # size of the cartesian product of the relations
+        relations = list(relations)
+        domains = 1.0
+        for var in set(variables):
+            containing = [x for x in relations if var in x.free_variables]
+            if containing:
+                domains *= min(self.distinct_count(x, var) for x in containing)
+        product = math.prod(self.row_count(x) for x in relations)
+        return min(domains, product)
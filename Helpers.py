@@ -1,17 +1,18 @@
-import itertools
+from collections import OrderedDict
+from typing import Iterator
 
-from Query import Query
+from Query import Query, query_name_mask
 from Relation import Relation
 
 
 def find_compatible(chosen: "Query", options: list[Query]):
+    chosen_bit = 1 << chosen.query_id
     res = []
     for option in options:
         if option.name == chosen.name:
             continue
-        dependant_ons = set()
-        option.dependant_on_deep(dependant_ons)
-        if any(map(lambda x: x.name == chosen.name and x != chosen, dependant_ons)):
+        # ancestor_mask hands out the ids of the ancestors, so the name mask is read after it
+        if option.ancestor_mask & query_name_mask(chosen.name) & ~chosen_bit:
             continue
         res.append(option)
     return res
@@ -33,39 +34,201 @@ def find_compatible_reductions(options: list[Query]) -> list[set[Query]]:
         res.extend(sub_solutions)
     return res
 
-def is_homomorphism(q_query: "Query", nq_query: "Query"):
-    q_query_vars: "dict[str, list[str]]" = {}
-    posi_to_q_var_name: "dict[str, str]" = {}
-    for rel in q_query.relations:
-        for free_var in rel.free_variables:
-            posi_to_q_var_name[f"{rel.name}.{rel.free_variables.index(free_var)}"] = free_var
-            if free_var in q_query_vars:
-                q_query_vars[free_var].append(f"{rel.name}.{rel.free_variables.index(free_var)}")
+
+def first_compatible_reduction(options: "list[Query]", size: int) -> "set[Query]|None":
+    # the first set of find_compatible_reductions(options) with exactly size queries, without enumerating the rest
+    names = {x.name for x in options}
+    if len(names) < size:
+        return None
+    if size == 0:
+        return set() if not options else None
+    next_query_name = sorted(names)[0]
+    for option in filter(lambda x: x.name == next_query_name, options):
+        sub_solution = first_compatible_reduction(find_compatible(option, options), size - 1)
+        if sub_solution is not None:
+            sub_solution.add(option)
+            return sub_solution
+    return None
+
+def exact_cover_reduction(options: "list[Query]", size: int) -> "set[Query]|None":
+    # same result as first_compatible_reduction: one variant per name, names in sorted order, variants in list
+    # order, but the domains of the names not chosen yet are bitsets that are narrowed by every choice
+    if len({x.name for x in options}) != size:
+        return first_compatible_reduction(options, size)
+    return next(exact_cover_reductions(options, size), None)
+
+
+def exact_cover_reductions(options: "list[Query]", size: int) -> "Iterator[set[Query]]":
+    # every reduction, in the order exact_cover_reduction tries them
+    names = sorted({x.name for x in options})
+    if len(names) != size:
+        yield from filter(lambda x: len(x) == size, find_compatible_reductions(options))
+        return
+    name_index = {name: i for i, name in enumerate(names)}
+    variants: "list[list[Query]]" = [[] for _ in names]
+    for option in options:
+        variants[name_index[option.name]].append(option)
+    variant_index: "dict[Query, int]" = {}
+    for name_variants in variants:
+        for j, variant in enumerate(name_variants):
+            variant_index[variant] = j
+
+    # choosing variant j of name k keeps the variants of a later name m in
+    # unrestricted[k][m] | only_with[k][j].get(m, 0)
+    unrestricted = [[(1 << len(name_variants)) - 1 for name_variants in variants] for _ in names]
+    only_with: "list[list[dict[int, int]]]" = [[{} for _ in name_variants] for name_variants in variants]
+    for m, name_variants in enumerate(variants):
+        for bit, variant in enumerate(name_variants):
+            dependant_ons_by_name: "dict[str, list[Query]]" = {}
+            for dep in variant.ancestors:
+                dependant_ons_by_name.setdefault(dep.name, []).append(dep)
+            for dep_name, deps in dependant_ons_by_name.items():
+                k = name_index.get(dep_name)
+                if k is None or k >= m:
+                    continue
+                unrestricted[k][m] &= ~(1 << bit)
+                if len(deps) == 1 and deps[0] in variant_index:
+                    j = variant_index[deps[0]]
+                    only_with[k][j][m] = only_with[k][j].get(m, 0) | (1 << bit)
+
+    choice = [0] * len(names)
+
+    def assign(k: int, domains: "list[int]"):
+        if k == len(names):
+            yield {variants[m][j] for m, j in enumerate(choice)}
+            return
+        domain = domains[k]
+        while domain:
+            lowest = domain & -domain
+            domain ^= lowest
+            j = lowest.bit_length() - 1
+            narrowed = domains[:k + 1]
+            for m in range(k + 1, len(names)):
+                narrowed_domain = domains[m] & (unrestricted[k][m] | only_with[k][j].get(m, 0))
+                if not narrowed_domain:
+                    break
+                narrowed.append(narrowed_domain)
             else:
-                q_query_vars[free_var]=[f"{rel.name}.{rel.free_variables.index(free_var)}"]
-    q_query_join_positions = set()
-    for posis in q_query_vars.values():
-        q_query_join_positions.update(map(lambda x: '='.join(sorted(x)), itertools.combinations(posis, 2)))
-    nq_query_vars: "dict[str, list[str]]" = {}
-    q_var_to_nq_var: "dict[str,str]" = {}
+                choice[k] = j
+                yield from assign(k + 1, narrowed)
+
+    yield from assign(0, [(1 << len(name_variants)) - 1 for name_variants in variants])
+
+
+class HomomorphismCache:
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, dict[int, int]|None]" = OrderedDict()
+
+    def get(self, key: tuple):
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        return _MISSING
+
+    def put(self, key: tuple, value: "dict[int, int]|None"):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+_MISSING = object()
+homomorphism_cache = HomomorphismCache()
+
+
+# variable-name independent description of a query's relations, as far as is_homomorphism looks at it
+class QueryStructure:
+    def __init__(self, query: "Query"):
+        # homomorphism_mapping adds the join variables to the free variables of the queries it compares
+        self.key = (query.key, frozenset(query.free_variables))
+        self.ids: "dict[str, int]" = {}
+        self.names: "list[str]" = []
+        join_variables: "set[str]" = set()
+        relations = []
+        for rel in sorted(query.relations, key=lambda x: x.name):
+            for var in rel.free_variables:
+                if var in self.ids:
+                    join_variables.add(var)
+                else:
+                    self.ids[var] = len(self.names)
+                    self.names.append(var)
+            relations.append((rel.name, tuple(self.ids[var] for var in rel.free_variables)))
+        # self joins and repeated variables make is_homomorphism depend on iteration order, those are not cached
+        self.cacheable = len({x.name for x in query.relations}) == len(relations) and \
+            all(len(set(rel.free_variables)) == len(rel.free_variables) for rel in query.relations)
+        free_ids = frozenset(self.ids[var] for var in query.free_variables if var in self.ids)
+        join_ids = frozenset(self.ids[var] for var in join_variables)
+        self.as_q_query = (tuple(relations), free_ids)
+        self.as_nq_query = (tuple(relations), free_ids.union(join_ids))
+
+    @staticmethod
+    def of(query: "Query") -> "QueryStructure":
+        structure = query._homomorphism_structure
+        if structure is None or structure.key != (query.key, frozenset(query.free_variables)):
+            structure = QueryStructure(query)
+            query._homomorphism_structure = structure
+        return structure
+
+
+def view_query(q_query: "Query", nq_query: "Query", new_view_free_vars: "set[str]"):
+    q_query_rel_names = set(map(lambda x: x.name, q_query.relations))
+    replaced_rels = list(filter(lambda x: x.name in q_query_rel_names, nq_query.relations))
+    remaining_rels = nq_query.atoms.difference(replaced_rels)
+    remaining_rels.add(Relation(f"V_{q_query.name}", tuple(new_view_free_vars), replaced_rels))
+    return Query(nq_query.name, nq_query.relations, nq_query.free_variables, remaining_rels)
+
+
+def is_homomorphism(q_query: "Query", nq_query: "Query", cache: "HomomorphismCache|None" = homomorphism_cache):
+    key = None
+    if cache is not None:
+        q_structure = QueryStructure.of(q_query)
+        nq_structure = QueryStructure.of(nq_query)
+        if q_structure.cacheable and nq_structure.cacheable:
+            key = (q_structure.as_q_query, nq_structure.as_nq_query)
+            var_mapping = cache.get(key)
+            if var_mapping is not _MISSING:
+                nq_query.free_variables.update(nq_query.join_signature.join_variables)
+                if var_mapping is None:
+                    return None
+                new_view_free_vars = {nq_structure.names[var_mapping[q_structure.ids[q_var]]] for q_var in
+                                      filter(lambda x: q_structure.ids.get(x) in var_mapping, q_query.free_variables)}
+                return view_query(q_query, nq_query, new_view_free_vars)
+    q_var_to_nq_var = homomorphism_mapping(q_query, nq_query)
+    if key is not None:
+        cache.put(key, None if q_var_to_nq_var is None else
+                  {q_structure.ids[q_var]: nq_structure.ids[nq_var] for q_var, nq_var in q_var_to_nq_var.items()})
+    if q_var_to_nq_var is None:
+        return None
+    new_view_free_vars: "set[str]" = {q_var_to_nq_var[q_var] for q_var in filter(lambda x:x in q_var_to_nq_var, q_query.free_variables) }
+    return view_query(q_query, nq_query, new_view_free_vars)
+
+
+def homomorphism_mapping(q_query: "Query", nq_query: "Query") -> "dict[str, str]|None":
+    q_signature = q_query.join_signature
+    nq_signature = nq_query.join_signature
     required_vars: "set[str]" = nq_query.free_variables
-    for rel in nq_query.relations:
-        for free_var in rel.free_variables:
-            posi = f"{rel.name}.{rel.free_variables.index(free_var)}"
-            if posi in posi_to_q_var_name:
-                q_var_to_nq_var[posi_to_q_var_name[posi]] = free_var
-            if free_var in nq_query_vars:
-                required_vars.add(free_var)
-                nq_query_vars[free_var].append(posi)
-            else:
-                nq_query_vars[free_var] = [posi]
-    nq_query_join_positions = set()
-    for posis in nq_query_vars.values():
-        nq_query_join_positions.update(map(lambda x: '='.join(sorted(x)), itertools.combinations(posis, 2)))
-    homomorphism = q_query_join_positions.issubset(nq_query_join_positions)
-    if not homomorphism:
+    required_vars.update(nq_signature.join_variables)
+    if not q_signature.join_pairs.issubset(nq_signature.join_pairs):
         return None
 
+    q_var_to_nq_var: "dict[str,str]" = {}
+    for posi, free_var in nq_signature.positions:
+        if posi in q_signature.position_to_var:
+            q_var_to_nq_var[q_signature.position_to_var[posi]] = free_var
+
     q_query_rel_names = set(map(lambda x: x.name, q_query.relations))
     replaced_rels = list(filter(lambda x: x.name in q_query_rel_names, nq_query.relations))
 
@@ -77,11 +240,6 @@ def is_homomorphism(q_query: "Query", nq_query: "Query"):
 
     new_view_free_vars: "set[str]" = {q_var_to_nq_var[q_var] for q_var in filter(lambda x:x in q_var_to_nq_var, q_query.free_variables) }
     if required_view_vars.issubset(new_view_free_vars):
-        remaining_rels = nq_query.atoms.difference(replaced_rels)
-        remaining_rels.add(Relation(f"V_{q_query.name}", list(new_view_free_vars), replaced_rels))
-        return Query(nq_query.name, nq_query.relations, nq_query.free_variables, remaining_rels)
+        return q_var_to_nq_var
 
     return None
-
-
-
@@ -10,6 +10,10 @@ if TYPE_CHECKING:
 
 
 class JoinOrderNode:
+    __slots__ = ("query_name", "child_rel_names", "children", "relations", "parent", "free_variables",
+                 "aggregated_variables", "designation", "M3_index", "refcount", "_all_relations_sources",
+                 "_all_relations_no_sources")
+
     def __init__(self, query_name: str,
                  child_rel_names: str,
                  relations: "set[Relation]",
@@ -19,15 +23,18 @@ class JoinOrderNode:
                  ):
         self.query_name: str = query_name
         self.child_rel_names: str = child_rel_names
-        self.children: "set[JoinOrderNode]" = set()
+        # leaves keep the shared empty tuple, inner nodes get their own collection
+        self.children: "set[JoinOrderNode]|list[JoinOrderNode]|tuple[()]" = ()
         self.relations: "set[Relation]" = relations
         self.parent: "JoinOrderNode|None" = None
         self.free_variables: "set[str]" = free_vars
         self.aggregated_variables: "set[str]" = aggregated_vars
         self.designation: "str" = designation
         self.M3_index: "int" = -1
-        self._all_relations_sources: "set[Relation]" = set()
-        self._all_relations_no_sources: "set[Relation]" = set()
+        # parents (or query roots) referencing this node, more than one once share_subtrees merged it
+        self.refcount: int = 1
+        self._all_relations_sources: "set[Relation]|None" = None
+        self._all_relations_no_sources: "set[Relation]|None" = None
 
 
     def all_relations(self, source_only = False) -> "set[Relation]":
@@ -49,10 +56,12 @@ class JoinOrderNode:
             self._all_relations_no_sources = res
         return res
 
-    def M3ViewName(self, ring: str, vars: "dict[str, M3Variable]"):
+    def M3ViewName(self, ring: str, vars: "dict[str, M3Variable]", prefix: str = "", free_variables: "list[str]|None" = None):
+        # free_variables renames the keys, e.g. to read the map from another query
+        keys = ','.join(map(lambda x: vars[x].name, self.free_variables if free_variables is None else free_variables))
         if self.aggregated_variables:
-            return f"{self.designation}_{self.child_rel_names}({ring}<[{self.M3_index}, {','.join(map(lambda x: vars[x].var_type, self.aggregated_variables))}]>)[][{','.join(map(lambda x: vars[x].name, self.free_variables))}]"
-        return f"{self.designation}_{self.child_rel_names}({ring}<[]>)[][{','.join(map(lambda x: vars[x].name, self.free_variables))}]"
+            return f"{prefix}{self.designation}_{self.child_rel_names}({ring}<[{self.M3_index}, {','.join(map(lambda x: vars[x].var_type, self.aggregated_variables))}]>)[][{keys}]"
+        return f"{prefix}{self.designation}_{self.child_rel_names}({ring}<[]>)[][{keys}]"
 
     def graph_viz_name(self):
         if self.aggregated_variables:
@@ -134,6 +143,7 @@ class JoinOrderNode:
                                  free_vars=simple_vars,
                                  aggregated_vars=set(),
                                  designation='H')
+            h_node.children = set()
             for rel in _iter.relations:
                 child_node = JoinOrderNode(query_name=query.name,
                                            child_rel_names=rel.name,
@@ -166,6 +176,7 @@ class JoinOrderNode:
                                  free_vars=strict_parent_vars,
                                  aggregated_vars=bound_vars,
                                  designation='V')
+            h_node.children = set()
 
             return_node = h_node
 
@@ -176,10 +187,49 @@ class JoinOrderNode:
             h_node.children.add(sub)
         return return_node
 
-    def viz(self, graph: "Digraph", query: "Query"):
-        graph.node(str(self), label=self.graph_viz_name())
+    @staticmethod
+    def share_subtrees(roots: "list[JoinOrderNode]") -> "list[JoinOrderNode]":
+        # merges structurally identical subtrees of freshly generated trees, also across queries, into one node.
+        # The first occurrence is kept, so a shared node keeps the query_name of the first tree containing it
+        canonical: "dict[tuple, JoinOrderNode]" = {}
+        visited: "dict[int, JoinOrderNode]" = {}
+
+        def share(node: "JoinOrderNode") -> "JoinOrderNode":
+            if id(node) in visited:
+                shared = visited[id(node)]
+                shared.refcount += 1
+                return shared
+            children = [share(child) for child in node.children]
+            key = (node.designation, node.child_rel_names, frozenset(node.free_variables),
+                   frozenset(node.aggregated_variables), frozenset(map(lambda x: x.key, node.relations)),
+                   frozenset(map(id, children)))
+            shared = canonical.get(key)
+            if shared is None:
+                canonical[key] = shared = node
+                node.refcount = 1
+                if node.children:
+                    node.children = type(node.children)(children)
+                    for child in children:
+                        if child.refcount == 1:
+                            child.parent = node
+            else:
+                shared.refcount += 1
+            visited[id(node)] = shared
+            return shared
+
+        return [share(root) for root in roots]
+
+    def viz(self, graph: "Digraph", query: "Query", visited: "set[JoinOrderNode]|None" = None):
+        if visited is not None:
+            if self in visited:
+                return
+            visited.add(self)
+        if self.refcount > 1:
+            graph.node(str(self), label=self.graph_viz_name(), peripheries="2", xlabel=f"x{self.refcount}")
+        else:
+            graph.node(str(self), label=self.graph_viz_name())
         for child in self.children:
-            child.viz(graph, query)
+            child.viz(graph, query, visited)
             graph.edge(str(self), str(child))
         for relation in self.relations:
             rel_name = f"{query.name}_{relation.name}"
@@ -1,10 +1,16 @@
-from typing import TYPE_CHECKING
+import io
+import os
+from typing import TYPE_CHECKING, TextIO
 
 from JoinOrderNode import JoinOrderNode
 
 if TYPE_CHECKING:
+    from Query import Query, QuerySet
     from Relation import Relation
 
+# stands for the delta of a view relation until it is known which base relation triggered it
+VIEW_DELTA = "__view_delta__"
+
 
 class M3Generator:
     def __init__(self, config_file_path: str, dataset: str, ring: str):
@@ -13,6 +19,9 @@ class M3Generator:
         self.vars = {}
         self.relations = []
         self.var_index = 0
+        # set while writing a QuerySet: maps are prefixed with their query and views read the upstream maps
+        self.qualified = False
+        self.upstream: "dict[str, tuple[Query, JoinOrderNode]]" = {}
         with open(config_file_path, 'r') as config:
             first_line = config.readline()
             nr_vars, nr_relations = first_line.split(' ')
@@ -23,51 +32,79 @@ class M3Generator:
                 self.vars[line[1]] = (M3Variable(int(line[0]), line[1], line[2], set(map(lambda x: int(x), line[3].strip('{}').split(',')))))
             for _ in range(self.nr_relations):
                 line = config.readline().split(' ')
-                self.relations.append(M3Relation(line[0], int(line[1]), set(map(lambda x: self.vars[x], line[2].strip().split(',')))))
+                self.relations.append(M3Relation(line[0], int(line[1]), list(map(lambda x: self.vars[x], line[2].strip().split(',')))))
 
-    def assign_index(self, join_tree_node: "JoinOrderNode"):
+    def assign_index(self, join_tree_node: "JoinOrderNode", visited: "set[JoinOrderNode]|None" = None):
+        # visited keeps shared nodes from being indexed once per parent
+        if visited is not None:
+            if join_tree_node in visited:
+                return
+            visited.add(join_tree_node)
         join_tree_node.M3_index = self.var_index
         self.var_index += len(join_tree_node.aggregated_variables)
         for child in join_tree_node.children:
-            self.assign_index(child)
+            self.assign_index(child, visited)
+
+    def map_name(self, join_tree_node: "JoinOrderNode", free_variables: "list[str]|None" = None):
+        prefix = f"{join_tree_node.query_name}_" if self.qualified else ""
+        return join_tree_node.M3ViewName(self.ring, self.vars, prefix, free_variables)
+
+    def relation_reference(self, rel: "Relation"):
+        if rel.sources and rel.name[2:] in self.upstream:
+            upstream, root = self.upstream[rel.name[2:]]
+            mapping = upstream_variable_mapping(rel, upstream)
+            return f"{self.map_name(root, [mapping.get(x, x) for x in root.free_variables])}<Local>"
+        return f"{rel.M3ViewName(self.ring, self.vars)}<Local>"
+
+    def leaf_delta(self, rel: "Relation", operator: str):
+        if rel.sources and rel.name[2:] in self.upstream:
+            return VIEW_DELTA
+        return f"{'-' if operator == '-' else ''}1"
 
-    def generate_maps(self, join_tree_node: "JoinOrderNode"):
-        res = f'''\nDECLARE MAP {join_tree_node.M3ViewName(self.ring, self.vars)} :=\n'''
-        view_names = map(lambda x: f'{x.M3ViewName(self.ring, self.vars)}<Local>', join_tree_node.children)
-        relation_names = map(lambda x: f'{x.M3ViewName(self.ring, self.vars)}<Local>', join_tree_node.relations)
+    def generate_maps(self, join_tree_node: "JoinOrderNode", out: "TextIO", written: "set[JoinOrderNode]|None" = None):
+        if written is not None:
+            if join_tree_node in written:
+                return
+            written.add(join_tree_node)
+        out.write(f'''\nDECLARE MAP {self.map_name(join_tree_node)} :=\n''')
+        view_names = map(lambda x: f'{self.map_name(x)}<Local>', join_tree_node.children)
+        relation_names = map(self.relation_reference, join_tree_node.relations)
         joined_views = ' * '.join(list(view_names) + list(relation_names))
         if join_tree_node.aggregated_variables:
             lift = f"[lift<{join_tree_node.M3_index}>: {self.ring}<[{join_tree_node.M3_index}, {','.join(map(lambda x: self.vars[x].var_type, join_tree_node.aggregated_variables))}]>]({','.join(join_tree_node.aggregated_variables)})"
-            res += f"AggSum([{', '.join(join_tree_node.free_variables)}],\n (({joined_views}) * {lift})\n);\n"
+            out.write(f"AggSum([{', '.join(join_tree_node.free_variables)}],\n (({joined_views}) * {lift})\n);\n")
         else:
-            res += f"{joined_views}));\n"
+            out.write(f"{joined_views}));\n")
         for child in join_tree_node.children:
-            res += self.generate_maps(child)
-        return res
+            self.generate_maps(child, out, written)
 
-    def generate_queries(self, join_tree_node: "JoinOrderNode"):
-        res = f"DECLARE QUERY {join_tree_node.designation}_{join_tree_node.child_rel_names} := {join_tree_node.M3ViewName(self.ring, self.vars)}<Local>;\n"
+    def generate_queries(self, join_tree_node: "JoinOrderNode", out: "TextIO", written: "set[JoinOrderNode]|None" = None):
+        if written is not None:
+            if join_tree_node in written:
+                return
+            written.add(join_tree_node)
+        prefix = f"{join_tree_node.query_name}_" if self.qualified else ""
+        out.write(f"DECLARE QUERY {prefix}{join_tree_node.designation}_{join_tree_node.child_rel_names} := {self.map_name(join_tree_node)}<Local>;\n")
         for child in join_tree_node.children:
-            res += self.generate_queries(child)
-        return res
-    def generate_triggers(self, join_tree_node: "JoinOrderNode"):
+            self.generate_queries(child, out, written)
+
+    def generate_triggers(self, join_tree_node: "JoinOrderNode", out: "TextIO"):
+        for operator, updates in self.trigger_updates(join_tree_node).items():
+            for rel, value in updates.items():
+                self.write_trigger(out, operator, rel, value)
+
+    def trigger_updates(self, join_tree_node: "JoinOrderNode") -> "dict[str, dict[Relation, list[str]]]":
+        # the top node makes the root itself receive the delta, for inserts and deletes alike
         top = JoinOrderNode(join_tree_node.query_name, "", set(), set(), set(), "H")
         top.children = {join_tree_node}
-        res = ""
-        removals = self.generate_triggers_recursive(top, "+")
-        for rel, value in removals.items():
-            res += f"ON + {rel} ({', '.join(rel.free_variables)}) {{ \n "
-            for update in value:
-                res += f"{update};\n"
-            res += "}\n"
-
-        removals = self.generate_triggers_recursive(join_tree_node, "-")
-        for rel, value in removals.items():
-            res += f"ON - {rel} ({', '.join(rel.free_variables)}) {{ \n "
-            for update in value:
-                res += f"{update};\n"
-            res += "}\n"
-        return res
+        return {"+": self.generate_triggers_recursive(top, "+"), "-": self.generate_triggers_recursive(top, "-")}
+
+    @staticmethod
+    def write_trigger(out: "TextIO", operator: str, rel: "Relation", updates: "list[str]"):
+        out.write(f"ON {operator} {rel} ({', '.join(rel.free_variables)}) {{ \n ")
+        for update in updates:
+            out.write(f"{update};\n")
+        out.write("}\n")
 
     def generate_triggers_recursive(self, join_tree_node: "JoinOrderNode", operator: str)->"dict[Relation,list[str]]":
         res = {}
@@ -77,15 +114,15 @@ class M3Generator:
                 for key in resi.keys():
                     if child.designation == "V":
                         if len(resi[key]) == 0:
-                            resi[key].append(f"{child.M3ViewName(self.ring, self.vars)}<Local> += {'-' if operator == '-' else ''}1")
+                            resi[key].append(f"{self.map_name(child)}<Local> += {self.leaf_delta(key, operator)}")
                         else:
-                            resi[key].append(f"{child.M3ViewName(self.ring, self.vars)}<Local> += ({resi[key][-1].split('=')[1]} * Lift<{child.M3_index}>: {self.ring}<{child.M3_index}, {','.join(map(lambda x: self.vars[x].var_type, child.aggregated_variables))}>]({','.join(child.aggregated_variables)}))")
+                            resi[key].append(f"{self.map_name(child)}<Local> += ({resi[key][-1].split('=')[1]} * Lift<{child.M3_index}>: {self.ring}<{child.M3_index}, {','.join(map(lambda x: self.vars[x].var_type, child.aggregated_variables))}>]({','.join(child.aggregated_variables)}))")
                     else:
                         temp = resi[key][-1].split('=')[1].strip()
                         for sibling in child.children:
                             if not key in sibling.all_relations():
-                                temp = f"({temp} * {sibling.M3ViewName(self.ring, self.vars)}<Local>)"
-                        resi[key].append(f"{child.M3ViewName(self.ring, self.vars)}<Local> += {temp}")
+                                temp = f"({temp} * {self.map_name(sibling)}<Local>)"
+                        resi[key].append(f"{self.map_name(child)}<Local> += {temp}")
                 res.update(resi)
         else:
             resi: "dict[Relation,list[str]]" = {}
@@ -95,29 +132,140 @@ class M3Generator:
             res.update(resi)
 
         return res
-    def generate(self, join_tree_node: "JoinOrderNode"):
+
+    def generate(self, join_tree_node: "JoinOrderNode", output: "str|TextIO" = "output.m3"):
+        # output is a path or anything with a write method, e.g. an io.StringIO
+        if isinstance(output, (str, os.PathLike)):
+            with open(output, "w") as f:
+                self.write(join_tree_node, f)
+        else:
+            self.write(join_tree_node, output)
+
+    def generate_query_set(self, query_set: "QuerySet", output: "str|TextIO" = "output.m3", share_views: bool = True):
+        if isinstance(output, (str, os.PathLike)):
+            with open(output, "w") as f:
+                self.write_query_set(query_set, f, share_views)
+        else:
+            self.write_query_set(query_set, output, share_views)
+
+    def generate_string(self, join_tree_node: "JoinOrderNode") -> str:
+        out = io.StringIO()
+        self.write(join_tree_node, out)
+        return out.getvalue()
+
+    def write(self, join_tree_node: "JoinOrderNode", out: "TextIO"):
         self.assign_index(join_tree_node)
-        res = '''---------------- TYPE DEFINITIONS ---------------
+        self.write_header(out)
+        out.write('''\n-------------------- MAPS --------------------\n''')
+        self.generate_maps(join_tree_node, out)
+        out.write('''\n-------------------- QUERIES --------------------\n''')
+        self.generate_queries(join_tree_node, out)
+        out.write('''\n-------------------- TRIGGERS --------------------\n''')
+        self.generate_triggers(join_tree_node, out)
+
+    def write_query_set(self, query_set: "QuerySet", out: "TextIO", share_views: bool = True):
+        # one program for all queries, a view V_Qx reads the map of Qx instead of recomputing it from its sources.
+        # With share_views, identical subtrees of different queries are maintained as one map
+        queries = upstream_first(query_set)
+        join_trees = [JoinOrderNode.generate(query.variable_order, query) for query in queries]
+        if share_views:
+            join_trees = JoinOrderNode.share_subtrees(join_trees)
+        indexed = set()
+        for join_tree_node in join_trees:
+            self.assign_index(join_tree_node, indexed)
+        self.qualified = True
+        self.upstream = {query.name: (query, join_tree_node) for query, join_tree_node in zip(queries, join_trees)}
+        try:
+            self.write_header(out)
+            out.write('''\n-------------------- MAPS --------------------\n''')
+            written = set()
+            for join_tree_node in join_trees:
+                self.generate_maps(join_tree_node, out, written)
+            out.write('''\n-------------------- QUERIES --------------------\n''')
+            written = set()
+            for query, join_tree_node in zip(queries, join_trees):
+                self.generate_queries(join_tree_node, out, written)
+                if join_tree_node.query_name != query.name:
+                    # the root map is shared with another query, it is still readable under this query's name
+                    out.write(f"DECLARE QUERY {query.name}_{join_tree_node.designation}_{join_tree_node.child_rel_names} := {self.map_name(join_tree_node)}<Local>;\n")
+            out.write('''\n-------------------- TRIGGERS --------------------\n''')
+            self.generate_query_set_triggers(queries, join_trees, out)
+        finally:
+            self.qualified = False
+            self.upstream = {}
+
+    def generate_query_set_triggers(self, queries: "list[Query]", join_trees: "list[JoinOrderNode]", out: "TextIO"):
+        # per base relation name: the relation of the trigger head and its updates, upstream queries first.
+        # A shared map is reached through every query containing it, with the same update each time
+        triggers: "dict[str, dict[str, tuple[Relation, dict[str, None]]]]" = {"+": {}, "-": {}}
+        # per query and base relation name: the delta of the query's last updated map
+        deltas: "dict[str, dict[str, dict[str, str]]]" = {"+": {}, "-": {}}
+        for query, join_tree_node in zip(queries, join_trees):
+            for operator, updates in self.trigger_updates(join_tree_node).items():
+                own_deltas = deltas[operator].setdefault(query.name, {})
+                for rel, value in updates.items():
+                    if not value:
+                        continue
+                    if VIEW_DELTA not in value[0]:
+                        expanded = [(rel, value)]
+                    else:
+                        upstream_deltas = deltas[operator].get(rel.name[2:], {})
+                        expanded = [(source, [update.replace(VIEW_DELTA, f"({upstream_deltas[source.name]})") for update in value])
+                                    for source in sorted(rel.root_sources(), key=lambda x: x.name) if source.name in upstream_deltas]
+                    for source, source_updates in expanded:
+                        triggers[operator].setdefault(source.name, (source, {}))[1].update(dict.fromkeys(source_updates))
+                        own_deltas[source.name] = source_updates[-1].split('=')[1].strip()
+        for operator, per_relation in triggers.items():
+            for rel, value in per_relation.values():
+                self.write_trigger(out, operator, rel, list(value))
+
+    def write_header(self, out: "TextIO"):
+        out.write('''---------------- TYPE DEFINITIONS ---------------
 CREATE DISTRIBUTED TYPE RingFactorizedRelation
 FROM FILE 'ring/ring_factorized.hpp'
 WITH PARAMETER SCHEMA (dynamic_min);
 
 -------------------- SOURCES --------------------
-'''
+''')
         for rel in self.relations:
-            res += rel.generate_source(self.dataset)
-            res += "\n"
-        res += '''\n-------------------- MAPS --------------------\n'''
-        res += self.generate_maps(join_tree_node)
-        res += '''\n-------------------- QUERIES --------------------\n'''
-        res += self.generate_queries(join_tree_node)
-        res += '''\n-------------------- TRIGGERS --------------------\n'''
-        res += self.generate_triggers(join_tree_node)
-        with open("output.m3", "w") as f:
-            f.write(res)
-        # print(res)
+            out.write(rel.generate_source(self.dataset))
+            out.write("\n")
+
+
+
+
+def upstream_variable_mapping(view: "Relation", upstream: "Query") -> "dict[str, str]":
+    # the sources of a view are the replaced relations of the downstream query, their names and arity match the
+    # relations of the upstream query, so the variables line up by position
+    res = {}
+    upstream_relations = {rel.name: rel for rel in upstream.relations}
+    for source in view.sources:
+        if source.name in upstream_relations:
+            res.update(zip(upstream_relations[source.name].free_variables, source.free_variables))
+    return res
+
+
+def upstream_first(query_set: "QuerySet") -> "list[Query]":
+    by_name = {query.name: query for query in query_set.queries}
+    res = []
+    visiting = set()
 
+    def visit(query: "Query"):
+        if query in res:
+            return
+        if query.name in visiting:
+            raise ValueError(f"Cyclic views through {query.name}")
+        visiting.add(query.name)
+        for rel in sorted(query.atoms, key=lambda x: x.name):
+            if rel.sources:
+                if rel.name[2:] not in by_name:
+                    raise ValueError(f"{query.name} reads {rel.name}, but {rel.name[2:]} is not part of the query set")
+                visit(by_name[rel.name[2:]])
+        res.append(query)
 
+    for query in sorted(query_set.queries, key=lambda x: x.name):
+        visit(query)
+    return res
 
 
 class M3Variable:
@@ -133,13 +281,15 @@ class M3Variable:
         return self.index == other.index
 
 class M3Relation:
-    def __init__(self, name: str, nr: int, variables: "set[M3Variable]"):
+    def __init__(self, name: str, nr: int, variables: "list[M3Variable]"):
         self.name: str = name
         self.nr: int = nr
-        self.variables: "set[M3Variable]" = variables
+        # columns of the .tbl file, in the order of the config
+        self.columns: "list[M3Variable]" = list(variables)
+        self.variables: "set[M3Variable]" = set(variables)
 
     def generate_source(self, dataset:str):
-        return f"CREATE STREAM {self.name} ({','.join(map(lambda x: f'{x.name} {x.var_type}', self.variables))})\n  FROM FILE './datasets/{dataset}/{self.name.capitalize()}.tbl' LINE DELIMITED CSV (delimiter := '|');"
+        return f"CREATE STREAM {self.name} ({','.join(map(lambda x: f'{x.name} {x.var_type}', self.columns))})\n  FROM FILE './datasets/{dataset}/{self.name.capitalize()}.tbl' LINE DELIMITED CSV (delimiter := '|');"
 
     def __hash__(self):
         return hash(self.name)
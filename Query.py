@@ -1,13 +1,62 @@
 import itertools
+from typing import TYPE_CHECKING
 
 from graphviz import Digraph
 
 from JoinOrderNode import JoinOrderNode
 from VariableOrder import VariableOrderNode
 from Relation import Relation
+import symbols
+
+if TYPE_CHECKING:
+    from Catalog import Catalog
+
+
+_query_name_masks: "dict[str, int]" = {}
+
+
+def query_name_mask(name: str) -> int:
+    # bits of all query ids handed out to queries with this name
+    return _query_name_masks.get(name, 0)
+
+
+def reset_query_ids():
+    # query ids and the masks built from them only live for one cascade.run, so they do not grow across runs
+    symbols.query_bits.clear()
+    _query_name_masks.clear()
+
+
+class JoinSignature:
+    def __init__(self, relations: "set[Relation]"):
+        self.generation = symbols.positions.generation
+        # (position, variable) in the iteration order of the relations
+        self.positions: "list[tuple[int, str]]" = []
+        self.position_to_var: "dict[int, str]" = {}
+        # variables occurring more than once, in the order of their second occurrence
+        self.join_variables: "list[str]" = []
+        var_positions: "dict[str, list[int]]" = {}
+        for rel in relations:
+            first_index: "dict[str, int]" = {}
+            for index, var in enumerate(rel.free_variables):
+                posi = symbols.positions.intern((rel.name, first_index.setdefault(var, index)))
+                self.positions.append((posi, var))
+                self.position_to_var[posi] = var
+                if var in var_positions:
+                    if len(var_positions[var]) == 1:
+                        self.join_variables.append(var)
+                    var_positions[var].append(posi)
+                else:
+                    var_positions[var] = [posi]
+        # every pair of positions sharing a variable, packed into one int
+        self.join_pairs: "frozenset[int]" = frozenset(
+            min(a, b) << 32 | max(a, b) for posis in var_positions.values() for a, b in itertools.combinations(posis, 2))
 
 
 class Query:
+    __slots__ = ("name", "free_variables", "relations", "atoms", "_variable_order", "key", "hash_key", "_symbol",
+                 "_symbol_generation", "_is_q_hierarchical", "dependant_on", "_homomorphism_structure", "_join_signature",
+                 "_query_id", "_ancestors", "_ancestor_names", "_ancestor_mask", "_relation_name_mask",
+                 "_relation_name_mask_generation", "_query_id_generation")
 
     def __init__(self, name: str, relations: "set[Relation]", free_variables: "set[str]", atoms: "set[Relation]|None" = None):
         self.name = name
@@ -15,9 +64,22 @@ class Query:
         self.relations: "set[Relation]" = relations
         self.atoms: "set[Relation]" = atoms if atoms else relations
         self._variable_order: "VariableOrderNode | None" = None
-        self.hash_key = hash(f"{self.name}-{'/'.join(sorted(map(lambda x: str(hash(x)), self.atoms)))}")
+        self.key = (self.name, frozenset(map(lambda x: x.key, self.atoms)))
+        self.hash_key = hash(self.key)
+        self._symbol = symbols.queries.intern(self.key)
+        self._symbol_generation = symbols.queries.generation
         self._is_q_hierarchical: bool|None = None
         self.dependant_on: "set[Query]" = set()
+        self._homomorphism_structure = None
+        self._join_signature: "JoinSignature|None" = None
+        self._query_id: "int|None" = None
+        self._ancestors: "frozenset[Query]|None" = None
+        self._ancestor_names: "frozenset[str]" = frozenset()
+        self._ancestor_mask: "int|None" = None
+        self._relation_name_mask: "int|None" = None
+        self._relation_name_mask_generation = -1
+        # generation of symbols.query_bits that _query_id and _ancestor_mask were handed out in
+        self._query_id_generation = -1
 
     def dependant_on_deep(self, res: "set[Query]"):
         if not self.dependant_on:
@@ -28,14 +90,71 @@ class Query:
                     res.add(dep)
                     dep.dependant_on_deep(res)
 
+    def _check_query_id_generation(self):
+        if self._query_id_generation != symbols.query_bits.generation:
+            self._query_id_generation = symbols.query_bits.generation
+            self._query_id = None
+            self._ancestor_mask = None
+
+    @property
+    def query_id(self) -> int:
+        # equal queries share an id
+        self._check_query_id_generation()
+        if self._query_id is None:
+            nr_bits = len(symbols.query_bits)
+            self._query_id = symbols.query_bits.intern(self.key)
+            if self._query_id == nr_bits:
+                _query_name_masks[self.name] = query_name_mask(self.name) | 1 << self._query_id
+        return self._query_id
+
+    # the dependency closure is computed on first use, dependant_on must not change afterwards
+    @property
+    def ancestors(self) -> "frozenset[Query]":
+        if self._ancestors is None:
+            res = set()
+            self.dependant_on_deep(res)
+            self._ancestors = frozenset(res)
+            self._ancestor_names = frozenset(x.name for x in res)
+        return self._ancestors
+
+    @property
+    def ancestor_names(self) -> "frozenset[str]":
+        self.ancestors
+        return self._ancestor_names
+
+    @property
+    def ancestor_mask(self) -> int:
+        self._check_query_id_generation()
+        if self._ancestor_mask is None:
+            self._ancestor_mask = 0
+            for ancestor in self.ancestors:
+                self._ancestor_mask |= 1 << ancestor.query_id
+        return self._ancestor_mask
+
+    @property
+    def relation_name_mask(self) -> int:
+        if self._relation_name_mask is None or self._relation_name_mask_generation != symbols.relation_names.generation:
+            self._relation_name_mask_generation = symbols.relation_names.generation
+            self._relation_name_mask = 0
+            for rel in self.relations:
+                self._relation_name_mask |= 1 << symbols.relation_names.intern(rel.name)
+        return self._relation_name_mask
+
+    @property
+    def join_signature(self) -> "JoinSignature":
+        if self._join_signature is None or self._join_signature.generation != symbols.positions.generation:
+            self._join_signature = JoinSignature(self.relations)
+        return self._join_signature
+
     @property
     def variable_order(self):
         if not self._variable_order:
             self.generate_variable_order()
         return self._variable_order
 
-    def generate_variable_order(self):
-        self._variable_order = VariableOrderNode.generate(self.atoms, self.free_variables)
+    def generate_variable_order(self, catalog: "Catalog|None" = None):
+        # with a catalog the order follows the estimated view sizes instead of how often variables occur
+        self._variable_order = VariableOrderNode.generate(self.atoms, self.free_variables, catalog)
 
     def is_q_hierarchical(self) -> bool:
         if self._is_q_hierarchical is not None:
@@ -77,23 +196,36 @@ class Query:
 
     def clean_copy(self):
         for rel in self.relations:
-            rel._root_sources = set()
+            rel._root_sources = None
         return Query(self.name, self.relations, self.free_variables, self.atoms)
 
     def __str__(self):
         return self.name + "(" + ",".join(sorted(self.free_variables)) +")" + " = " + "*".join(sorted(map(lambda x: str(x), self.atoms)))
 
+    def __reduce__(self):
+        # interned ids only mean something in the process that handed them out, the caches are rebuilt from them
+        return Query, (self.name, self.relations, self.free_variables, self.atoms), (None, {"dependant_on": self.dependant_on})
+
     def __hash__(self):
         return self.hash_key
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        if not isinstance(other, Query):
+            return NotImplemented
+        if self._symbol_generation == other._symbol_generation:
+            return self._symbol == other._symbol
+        return self.key == other.key
 
 
 class QuerySet:
     def __init__(self, queries: "set[Query]"):
         self.queries: "set[Query]" = queries
-        self.hash_key = hash(",".join(sorted(map(lambda x: str(hash(x)), self.queries))))
+        # maintenance_cost breakdown, set when cascade.run ranked the reductions
+        self.cost: "dict|None" = None
+        self.key = frozenset(map(lambda x: x.key, self.queries))
+        self.hash_key = hash(self.key)
+        self._symbol = symbols.query_sets.intern(self.key)
+        self._symbol_generation = symbols.query_sets.generation
 
     def __hash__(self):
         return self.hash_key
@@ -102,20 +234,45 @@ class QuerySet:
         return ",".join(sorted(map(lambda x: str(x), self.queries)))
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        if not isinstance(other, QuerySet):
+            return NotImplemented
+        if self._symbol_generation == other._symbol_generation:
+            return self._symbol == other._symbol
+        return self.key == other.key
+
+    def join_orders(self, share_views: bool = True, catalog: "Catalog|None" = None) -> "list[tuple[Query, JoinOrderNode]]":
+        # with a catalog the trees follow the orders generate_variable_order(catalog) would build, without
+        # replacing the order the queries keep
+        queries = sorted(self.queries, key=lambda x: x.name)
+        if catalog is not None:
+            variable_orders = [VariableOrderNode.generate(query.atoms, query.free_variables, catalog) for query in queries]
+        else:
+            variable_orders = [query.variable_order for query in queries]
+        join_orders = [JoinOrderNode.generate(variable_order, query) for variable_order, query in zip(variable_orders, queries)]
+        if share_views:
+            join_orders = JoinOrderNode.share_subtrees(join_orders)
+        return list(zip(queries, join_orders))
 
-    def graph_viz(self, name = 0):
+    def graph_viz(self, name = 0, share_views: bool = True):
         graph = Digraph(name="base", graph_attr={"compound": "true", "spline":"false"})
         ress= []
-        for query in self.queries:
+        # a view shared by several queries is drawn once, in the cluster of the first of them
+        visited = set()
+        shared_roots = []
+        for query, join_order in self.join_orders(share_views):
             res = Digraph(name=f"cluster_{query.name}", graph_attr={"label": f"{query.name}({','.join(sorted(query.free_variables))})"})
-            join_order = JoinOrderNode.generate(query.variable_order, query)
-            join_order.viz(res, query)
+            if join_order in visited:
+                # the whole tree is another query's, the cluster links to its root
+                res.node(f"{query.name}_{join_order}", label=join_order.graph_viz_name(), style="dashed")
+                shared_roots.append((f"{query.name}_{join_order}", str(join_order)))
+            join_order.viz(res, query, visited)
             res.node(query.name, style="invis")
 
             ress.append(res)
         for res in ress:
             graph.subgraph(res)
+        for reference, root in shared_roots:
+            graph.edge(reference, root, style="dashed")
         for query in self.queries:
             for dep in query.dependant_on:
                 graph.edge(dep.name, query.name, _attributes={"ltail": f"cluster_{dep.name}", "lhead": f"cluster_{query.name}"})
@@ -1,5 +1,6 @@
 from typing import TYPE_CHECKING
 
+import symbols
 from M3Generator import M3Variable
 
 if TYPE_CHECKING:
@@ -7,19 +8,31 @@ if TYPE_CHECKING:
 
 
 class Relation:
+    __slots__ = ("index", "free_variables", "sources", "name", "key", "hash_val", "_symbol", "_symbol_generation",
+                 "_root_sources")
 
     def __init__(self, name: str, variables: "list[str]", sources: "list[Relation] | None" = None, index=-1):
         self.index = index
         self.free_variables = variables if variables else []
-        self.sources: "list[Relation]" = sources if sources else []
+        self.sources: "tuple[Relation, ...]" = tuple(sources) if sources else ()
         self.name = name
-        self.hash_val = hash(f"{'-'.join(self.free_variables)}:{','.join(map(lambda x: str(x), self.sources)) if self.sources else self.name}")
-        self.disp_name = self.name + "(" + ",".join(self.free_variables) + ")"
-        self._root_sources = set()
+        # views are identified by their sources, base relations by their name
+        if self.sources:
+            origin = tuple(map(lambda x: (x.name, tuple(x.free_variables)), self.sources))
+        else:
+            origin = self.name
+        self.key = (tuple(self.free_variables), origin)
+        self.hash_val = hash(self.key)
+        self._symbol = symbols.relations.intern(self.key)
+        self._symbol_generation = symbols.relations.generation
+        self._root_sources: "set[Relation]|None" = None
+
+    @property
+    def disp_name(self):
+        return self.name + "(" + ",".join(self.free_variables) + ")"
 
     def set_name(self, name: str):
         self.name = name
-        self.disp_name = self.name + "(" + ",".join(self.free_variables) + ")"
 
     def root_sources(self):
         if self._root_sources:
@@ -33,7 +46,7 @@ class Relation:
         return res
 
     def all_variables(self):
-        res = self.free_variables.copy()
+        res = list(self.free_variables)
         for source in self.sources:
             res.extend(source.all_variables())
         return res
@@ -41,8 +54,14 @@ class Relation:
     def M3ViewName(self, ring: str, vars: "dict[str, M3Variable]"):
         return f"{self.name}({ring}<[]>)[][{','.join(map(lambda x: vars[x].var_type, self.free_variables))}]"
 
+    def __reduce__(self):
+        # interned ids only mean something in the process that handed them out
+        return Relation, (self.name, self.free_variables, self.sources, self.index)
+
     def __eq__(self, other):
-        return self.hash_val == other.hash_val
+        if self._symbol_generation == other._symbol_generation:
+            return self._symbol == other._symbol
+        return self.key == other.key
 
     def __hash__(self):
         return self.hash_val
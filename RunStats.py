@@ -0,0 +1,39 @@
+import json
+import time
+from contextlib import contextmanager
+
+
+class RunStats:
+    def __init__(self):
+        self.counters: "dict[str, int]" = {}
+        self.phase_times: "dict[str, float]" = {}
+        self.events: "list[dict]" = []
+        self._start = time.perf_counter()
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name: str, seconds: float):
+        self.phase_times[name] = self.phase_times.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add_time(name, end - start)
+            self.events.append({"name": name, "ph": "X", "pid": 0, "tid": 0,
+                                "ts": (start - self._start) * 1e6, "dur": (end - start) * 1e6, "args": args})
+
+    def as_dict(self):
+        return {"counters": dict(self.counters), "phase_times": dict(self.phase_times)}
+
+    def write_chrome_trace(self, path: str):
+        # loadable in chrome://tracing, Perfetto or speedscope
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "otherData": self.as_dict()}, f)
+
+    def __repr__(self):
+        return json.dumps(self.as_dict(), indent=1)
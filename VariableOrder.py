@@ -1,17 +1,25 @@
 
+from typing import TYPE_CHECKING
+
 from graphviz import Digraph
 from Relation import Relation
 
+if TYPE_CHECKING:
+    from Catalog import Catalog
+
 
 class VariableOrderNode:
+    __slots__ = ("children", "name", "relations", "parent", "_all_relations_sources", "_all_relations_no_sources",
+                 "_parent_vars")
+
     def __init__(self, name: str, children: "set[VariableOrderNode]", relations: "set[Relation]", parent: "VariableOrderNode|None"):
         self.children = children
         self.name = name
         self.relations = relations
         self.parent = parent
-        self._all_relations_sources = set()
-        self._all_relations_no_sources = set()
-        self._parent_vars = set()
+        self._all_relations_sources: "set[Relation]|None" = None
+        self._all_relations_no_sources: "set[Relation]|None" = None
+        self._parent_vars: "set[str]|None" = None
 
     def graph_viz(self, graph: "Digraph|None" = None, rootname: str = ""):
         own_name = f"{rootname}_{self.name}"
@@ -86,24 +94,53 @@ class VariableOrderNode:
         return f"{self.name}-{','.join([rel.name for rel in self.relations])}-{','.join([child.name for child in self.children])}"
 
     @staticmethod
-    def generate(relations: "set[Relation]", free_variables: "set[str]"):
+    def cheapest_variable(variables: "set[str]", relations: "set[Relation]", parent_vars: "set[str]",
+                          free_variables: "set[str]", catalog: "Catalog") -> str:
+        # the variable whose subtree view and the view of the relations left beside it are estimated smallest.
+        # Variables the two sides share besides the parent variables are only joined above them, so both views
+        # are keyed by them as well. Ties go to the variable in most relations, then to free variables
+        def cost(var: str):
+            sub_relations = [rel for rel in relations if var in rel.free_variables]
+            rest = [rel for rel in relations if var not in rel.free_variables]
+            sub_vars = {x for rel in sub_relations for x in rel.free_variables}
+            rest_vars = {x for rel in rest for x in rel.free_variables}
+            keys = parent_vars.union(sub_vars.intersection(rest_vars))
+            res = catalog.view_size(sub_relations, sub_vars.intersection(keys | {var}))
+            if rest:
+                res += catalog.view_size(rest, rest_vars.intersection(keys))
+            return res, -len(sub_relations), var not in free_variables, var
+
+        # a variable whose relations are a strict subset of another variable's would split those relations into
+        # branches that both need the other variable, a variable of a single relation would be placed above
+        # relations it does not join with
+        atoms = {var: frozenset(rel for rel in relations if var in rel.free_variables) for var in variables}
+        maximal = {var for var in variables if not any(atoms[var] < atoms[other] for other in variables)}
+        join_variables = {var for var in maximal if len(atoms[var]) > 1}
+        return min(join_variables if join_variables else maximal, key=cost)
+
+    @staticmethod
+    def generate(relations: "set[Relation]", free_variables: "set[str]", catalog: "Catalog|None" = None):
 
         variables = set()
         for relation in relations:
             variables.update(relation.free_variables)
-        variable_list = list(variables)
+        if catalog is not None:
+            next_var = VariableOrderNode.cheapest_variable(variables, relations, set(), free_variables, catalog)
+        else:
+            variable_list = list(variables)
 
-        variable_list.sort(key=lambda x: sum([1 for rel in relations if x in rel.free_variables]) + (
-            0.1 if x in free_variables else 0), reverse=False)
+            variable_list.sort(key=lambda x: sum([1 for rel in relations if x in rel.free_variables]) + (
+                0.1 if x in free_variables else 0), reverse=False)
 
 
-        next_var = variable_list.pop()
+            next_var = variable_list.pop()
         root = VariableOrderNode(next_var, set(),set(), None)
-        VariableOrderNode.generate_recursion(relations, root, free_variables)
+        VariableOrderNode.generate_recursion(relations, root, free_variables, catalog)
         return root
 
     @staticmethod
-    def generate_recursion(relations: "set[Relation]", node: "VariableOrderNode", free_variables: "set[str]"):
+    def generate_recursion(relations: "set[Relation]", node: "VariableOrderNode", free_variables: "set[str]",
+                           catalog: "Catalog|None" = None):
         parent_vars = node.parent_variables()
         generateable_relations = {rel for rel in relations if set(rel.free_variables).issubset(parent_vars)}
         node.relations.update(generateable_relations)
@@ -115,16 +152,19 @@ class VariableOrderNode:
         for relation in ungenerateable_relations:
             variables.update(relation.free_variables)
         variables.difference_update(parent_vars)
-        variable_list = list(variables)
+        if catalog is not None:
+            next_var = VariableOrderNode.cheapest_variable(variables, ungenerateable_relations, parent_vars, free_variables, catalog)
+        else:
+            variable_list = list(variables)
 
-        variable_list.sort(key=lambda x: sum([1 for rel in ungenerateable_relations if x in rel.free_variables]) + (0.1 if x in free_variables else 0), reverse=False)
+            variable_list.sort(key=lambda x: sum([1 for rel in ungenerateable_relations if x in rel.free_variables]) + (0.1 if x in free_variables else 0), reverse=False)
 
-        next_var = variable_list.pop()
+            next_var = variable_list.pop()
         next_node = VariableOrderNode(next_var, set(), set(), node)
         node.children.add(next_node)
 
         sub_relations = {rel for rel in ungenerateable_relations if next_var in rel.free_variables}
 
-        VariableOrderNode.generate_recursion(sub_relations, next_node, free_variables)
-        VariableOrderNode.generate_recursion(ungenerateable_relations.difference(sub_relations), node, free_variables)
+        VariableOrderNode.generate_recursion(sub_relations, next_node, free_variables, catalog)
+        VariableOrderNode.generate_recursion(ungenerateable_relations.difference(sub_relations), node, free_variables, catalog)
 
@@ -0,0 +1,163 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+import cascade
+import symbols
+from Helpers import homomorphism_cache, is_homomorphism
+from JoinOrderNode import JoinOrderNode
+from M3Generator import M3Generator
+from Query import Query
+from QueryGenerator import generate
+from VariableOrder import VariableOrderNode
+
+STAGES = ["generate", "is_q_hierarchical", "variable_order", "join_order", "is_homomorphism", "cascade_run", "m3_generate"]
+NR_QUERIES = [3, 6, 10]
+NR_RELATIONS = [2, 3, 4]
+NR_VARIABLES = [2, 3, 4]
+
+
+def workload(nr_queries: int, nr_relations: float, nr_variables: float, seed: int) -> "list[Query]":
+    # generate() also draws from the global random state, reseeding makes every call return the same workload
+    random.seed(seed)
+    return generate(nr_queries=nr_queries,
+                    avg_nr_relations=nr_relations,
+                    std_nr_relations=1,
+                    avg_total_relations=nr_queries + nr_relations,
+                    std_total_relations=2,
+                    avg_nr_variables=nr_variables,
+                    std_nr_variables=1,
+                    avg_total_variables=2 * nr_variables + 2,
+                    std_total_variables=2,
+                    seed=seed)
+
+
+def write_m3_config(path: str, queries: "list[Query]"):
+    # the columns of a relation are named after its first occurrence. Queries may name them differently, the
+    # variables of every occurrence are declared so that each query's maps find their types
+    relations = {}
+    for query in queries:
+        for rel in query.relations:
+            relations.setdefault(rel.name, rel)
+    variables = sorted({var for query in queries for rel in query.relations for var in rel.free_variables})
+    with open(path, "w") as f:
+        f.write(f"{len(variables)} {len(relations)}\n")
+        for i, var in enumerate(variables):
+            f.write(f"{i} {var} int -1 {{}} 0\n")
+        for i, rel in enumerate(sorted(relations.values(), key=lambda x: x.name)):
+            f.write(f"{rel.name} {i} {','.join(rel.free_variables)}\n")
+
+
+def time_stages(nr_queries: int, nr_relations: float, nr_variables: float, seed: int, work_dir: str) -> "dict[str, tuple[float, int]]":
+    res = {}
+    symbols.reset()
+
+    start = time.perf_counter()
+    queries = workload(nr_queries, nr_relations, nr_variables, seed)
+    res["generate"] = (time.perf_counter() - start, 1)
+
+    start = time.perf_counter()
+    for query in queries:
+        query.is_q_hierarchical()
+    res["is_q_hierarchical"] = (time.perf_counter() - start, len(queries))
+
+    start = time.perf_counter()
+    variable_orders = [VariableOrderNode.generate(query.atoms, query.free_variables) for query in queries]
+    res["variable_order"] = (time.perf_counter() - start, len(queries))
+
+    start = time.perf_counter()
+    join_orders = [JoinOrderNode.generate(variable_order, query) for variable_order, query in zip(variable_orders, queries)]
+    res["join_order"] = (time.perf_counter() - start, len(queries))
+
+    config_path = os.path.join(work_dir, "config.txt")
+    write_m3_config(config_path, queries)
+    m3_generator = M3Generator(config_path, "benchmark", "RingFactorizedRelation")
+    start = time.perf_counter()
+    for join_order in join_orders:
+        m3_generator.generate(join_order, io.StringIO())
+    res["m3_generate"] = (time.perf_counter() - start, len(join_orders))
+
+    # is_homomorphism adds join variables to the free variables of its second argument, so it gets its own copy
+    queries = workload(nr_queries, nr_relations, nr_variables, seed)
+    pairs = [(q, nq) for q, nq in itertools.permutations(queries, 2)]
+    start = time.perf_counter()
+    for q, nq in pairs:
+        is_homomorphism(q, nq, cache=None)
+    res["is_homomorphism"] = (time.perf_counter() - start, len(pairs))
+
+    queries = workload(nr_queries, nr_relations, nr_variables, seed)
+    homomorphism_cache.clear()
+    start = time.perf_counter()
+    cascade.run(queries)
+    res["cascade_run"] = (time.perf_counter() - start, 1)
+    return res
+
+
+def run_benchmark(nr_queries: "list[int]" = NR_QUERIES,
+                  nr_relations: "list[float]" = NR_RELATIONS,
+                  nr_variables: "list[float]" = NR_VARIABLES,
+                  seeds: "list[int]" = range(100),
+                  _print: bool = True) -> "list[dict]":
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for point in itertools.product(nr_queries, nr_relations, nr_variables):
+            totals = {stage: [0.0, 0] for stage in STAGES}
+            for seed in seeds:
+                for stage, (seconds, calls) in time_stages(*point, seed, work_dir).items():
+                    totals[stage][0] += seconds
+                    totals[stage][1] += calls
+            for stage in STAGES:
+                seconds, calls = totals[stage]
+                rows.append({"nr_queries": point[0],
+                             "nr_relations": point[1],
+                             "nr_variables": point[2],
+                             "stage": stage,
+                             "seeds": len(seeds),
+                             "calls": calls,
+                             "seconds": seconds,
+                             "per_call_us": seconds / calls * 1e6 if calls else 0.0})
+            if _print:
+                print(f"queries={point[0]} relations={point[1]} variables={point[2]}: " +
+                      ", ".join(f"{row['stage']} {row['seconds'] * 1000:.1f}ms" for row in rows[-len(STAGES):]))
+    return rows
+
+
+def revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def write_results(path: str, rows: "list[dict]"):
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as f:
+            json.dump({"revision": revision(), "python": platform.python_version(), "results": rows}, f, indent=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every stage of the cascade pipeline on generated workloads")
+    parser.add_argument("--output", default="benchmark.json", help="results file, CSV if it ends in .csv, else JSON")
+    parser.add_argument("--seeds", type=int, default=100, help="workloads per grid point")
+    parser.add_argument("--seed-base", type=int, default=0)
+    parser.add_argument("--queries", type=int, nargs="+", default=NR_QUERIES)
+    parser.add_argument("--relations", type=float, nargs="+", default=NR_RELATIONS, help="average relations per query")
+    parser.add_argument("--variables", type=float, nargs="+", default=NR_VARIABLES, help="average variables per relation")
+    args = parser.parse_args()
+    results = run_benchmark(args.queries, args.relations, args.variables,
+                            list(range(args.seed_base, args.seed_base + args.seeds)))
+    write_results(args.output, results)
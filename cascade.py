@@ -1,57 +1,218 @@
-from Helpers import find_compatible_reductions, is_homomorphism
-from Query import Query, QuerySet
+import time
+from contextlib import nullcontext
+from multiprocessing import Pool
+
+from Catalog import Catalog
+from Helpers import exact_cover_reduction, exact_cover_reductions, find_compatible_reductions, first_compatible_reduction, \
+    is_homomorphism
+from Query import Query, QuerySet, reset_query_ids
 from Relation import Relation
+from RunStats import RunStats
+from cost import maintenance_cost
+
+
+def comparable(q_hierarchical_query: "Query", non_q_hierarchical_query: "Query", q_dependant_on_names: "set[str]"):
+    if non_q_hierarchical_query.name in q_dependant_on_names:
+        return False
+    return q_hierarchical_query.relation_name_mask & ~non_q_hierarchical_query.relation_name_mask == 0
+
+
+class RelationNameIndex:
+    def __init__(self, queries: "set[Query]"):
+        self.postings: "dict[str, set[Query]]" = {}
+        for query in queries:
+            self.add(query)
+
+    def add(self, query: "Query"):
+        for name in {x.name for x in query.relations}:
+            self.postings.setdefault(name, set()).add(query)
+
+    def covering(self, query: "Query") -> "set[Query]":
+        # the indexed queries whose relation names include all relation names of query
+        postings = sorted((self.postings.get(name, set()) for name in {x.name for x in query.relations}), key=len)
+        return set.intersection(*postings) if postings else set()
+
+
+def _evaluate_pairs(pairs: "list[tuple[Query, Query]]") -> "list[bool]":
+    return [is_homomorphism(q_query, nq_query) is not None for q_query, nq_query in pairs]
+
+
+def _detached(query: "Query"):
+    # only what is_homomorphism reads, so the dependency graph is not pickled along
+    return Query(query.name, query.relations, set(query.free_variables))
 
 
-def run(queries: "list[Query]"):
+def prefetch_homomorphisms(pool: "Pool", workers: int, pairs: "list[tuple[Query, Query]]") -> "dict[tuple[Query, Query], bool]":
+    if not pairs:
+        return {}
+    detached = {}
+    for pair in pairs:
+        for query in pair:
+            if query not in detached:
+                detached[query] = _detached(query)
+    chunk_size = -(-len(pairs) // (workers * 4))
+    chunks = [[(detached[q], detached[nq]) for q, nq in pairs[i:i + chunk_size]] for i in range(0, len(pairs), chunk_size)]
+    res = {}
+    for chunk_start, chunk_res in zip(range(0, len(pairs), chunk_size), pool.map(_evaluate_pairs, chunks)):
+        res.update(zip(pairs[chunk_start:chunk_start + chunk_size], chunk_res))
+    return res
+
+
+def choose_reduction(options: "list[Query]", size: int, reduction_search: str, catalog: "Catalog|None" = None,
+                     max_candidates: int = 64) -> "QuerySet|None":
+    if reduction_search == "cheapest":
+        # the cheapest to maintain of the first max_candidates reductions, the first one wins ties
+        res = None
+        for reduction in exact_cover_reductions(options, size):
+            candidate = QuerySet(reduction)
+            candidate.cost = maintenance_cost(candidate, catalog)
+            if res is None or candidate.cost["cost"] < res.cost["cost"]:
+                res = candidate
+            max_candidates -= 1
+            if max_candidates <= 0:
+                break
+        return res
+    if reduction_search in ("exact_cover", "first"):
+        search = exact_cover_reduction if reduction_search == "exact_cover" else first_compatible_reduction
+        reduction = search(options, size)
+        return QuerySet(reduction) if reduction is not None else None
+    if reduction_search == "all":
+        compatible = list(map(lambda x: QuerySet(x), filter(lambda x: len(x) == size, find_compatible_reductions(options))))
+        return compatible[0] if len(compatible) > 0 else None
+    raise ValueError(f"Unknown reduction search {reduction_search}")
+
+
+def _no_phase(name: str, **args):
+    return nullcontext()
+
+
+def run(queries: "list[Query]", semi_naive: bool = True, workers: int = 1, reduction_search: str = "exact_cover",
+        stats: "RunStats|None" = None, catalog: "Catalog|None" = None, max_candidates: int = 64):
+    # reduction_search "cheapest" ranks up to max_candidates reductions by maintenance_cost, using the catalog if
+    # given, and leaves the breakdown of the chosen one in QuerySet.cost
+    reset_query_ids()
+    if workers > 1:
+        with Pool(workers) as pool:
+            return _run(queries, semi_naive, reduction_search, pool, workers, stats, catalog, max_candidates)
+    return _run(queries, semi_naive, reduction_search, stats=stats, catalog=catalog, max_candidates=max_candidates)
+
+
+def _run(queries: "list[Query]", semi_naive: bool, reduction_search: str, pool: "Pool|None" = None, workers: int = 1,
+         stats: "RunStats|None" = None, catalog: "Catalog|None" = None, max_candidates: int = 64):
+    # per pair bookkeeping only happens under `if stats`, phases cost a nullcontext each without it
+    phase = stats.phase if stats else _no_phase
     q_hierarchical = set()
     non_q_hierarchical = set()
-    for query in queries:
-        if query.is_q_hierarchical():
-            # print(f"{query.name}: q-hierarchical")
-            q_hierarchical.add(query)
-        else:
-            # print(f"{query.name}: non-q-hierarchical")
-            non_q_hierarchical.add(query)
+    with phase("classify"):
+        for query in queries:
+            if query.is_q_hierarchical():
+                # print(f"{query.name}: q-hierarchical")
+                q_hierarchical.add(query)
+            else:
+                # print(f"{query.name}: non-q-hierarchical")
+                non_q_hierarchical.add(query)
+    if stats:
+        stats.count("input_queries", len(queries))
+        stats.count("input_q_hierarchical", len(q_hierarchical))
     past_comparisons: "set[tuple[Query, Query]]" = set()
+    relation_name_index = RelationNameIndex(non_q_hierarchical)
     res = q_hierarchical.copy()
+    # q-hierarchical queries that were compared against every non-q-hierarchical query of the previous round
+    exhausted: "set[Query]" = set()
+    delta_non_q_hierarchical: "set[Query]" = set()
+    # outcomes computed by the pool, including pairs a break deferred to a later round
+    homomorphic: "dict[tuple[Query, Query], bool]" = {}
+    round_nr = 0
     while True:
+        round_nr += 1
+        if stats:
+            stats.count("rounds")
         new_q_hierarchical = set()
         new_non_q_hierarchical = set()
-        for q_hierarchical_query in q_hierarchical:
-            for non_q_hierarchical_query in non_q_hierarchical:
-                if non_q_hierarchical_query.name == q_hierarchical_query.name or\
-                        (q_hierarchical_query, non_q_hierarchical_query) in past_comparisons:
-                    continue
-                past_comparisons.add((q_hierarchical_query, non_q_hierarchical_query))
-                q_dependant_on = set()
-                q_hierarchical_query.dependant_on_deep(q_dependant_on)
-                if non_q_hierarchical_query.name in map(lambda x: x.name, q_dependant_on):
-                    continue
-                q_hierarchical_query_relation_names = {x.name for x in q_hierarchical_query.relations}
-                non_q_hierarchical_query_relation_names = {x.name for x in non_q_hierarchical_query.relations}
-                if not q_hierarchical_query_relation_names.issubset(non_q_hierarchical_query_relation_names):
-                    continue
-                new_query = is_homomorphism(q_hierarchical_query, non_q_hierarchical_query)
-                if new_query:
-                    new_query.dependant_on.add(q_hierarchical_query)
-                    new_query.dependant_on.update(non_q_hierarchical_query.dependant_on)
-                    if new_query.is_q_hierarchical():
-                        new_q_hierarchical.add(new_query)
-                        break
+        with phase("candidates", round=round_nr):
+            # pairs are visited in the iteration order of non_q_hierarchical, as the early break depends on it
+            rank = {x: i for i, x in enumerate(non_q_hierarchical)}
+            candidates_of: "dict[Query, list[Query]]" = {}
+            for q_hierarchical_query in q_hierarchical:
+                candidates = relation_name_index.covering(q_hierarchical_query)
+                if stats:
+                    stats.count("skipped_relation_names", len(non_q_hierarchical) - len(candidates))
+                if semi_naive and q_hierarchical_query in exhausted:
+                    if stats:
+                        stats.count("skipped_semi_naive", len(candidates) - len(candidates & delta_non_q_hierarchical))
+                    candidates.intersection_update(delta_non_q_hierarchical)
+                candidates_of[q_hierarchical_query] = sorted(candidates, key=rank.__getitem__)
+        if pool:
+            pending = []
+            for q_hierarchical_query in q_hierarchical:
+                q_dependant_on_names = q_hierarchical_query.ancestor_names
+                for non_q_hierarchical_query in candidates_of[q_hierarchical_query]:
+                    pair = (q_hierarchical_query, non_q_hierarchical_query)
+                    if non_q_hierarchical_query.name != q_hierarchical_query.name and pair not in past_comparisons \
+                            and pair not in homomorphic and comparable(*pair, q_dependant_on_names):
+                        pending.append(pair)
+            with phase("prefetch", round=round_nr, pairs=len(pending)):
+                homomorphic.update(prefetch_homomorphisms(pool, workers, pending))
+            if stats:
+                stats.count("prefetched", len(pending))
+        with phase("pairs", round=round_nr):
+            for q_hierarchical_query in q_hierarchical:
+                exhausted.add(q_hierarchical_query)
+                for non_q_hierarchical_query in candidates_of[q_hierarchical_query]:
+                    if stats:
+                        stats.count("pairs_considered")
+                    if non_q_hierarchical_query.name == q_hierarchical_query.name or\
+                            (q_hierarchical_query, non_q_hierarchical_query) in past_comparisons:
+                        if stats:
+                            stats.count("skipped_same_name" if non_q_hierarchical_query.name == q_hierarchical_query.name
+                                        else "skipped_past_comparison")
+                        continue
+                    past_comparisons.add((q_hierarchical_query, non_q_hierarchical_query))
+                    if not comparable(q_hierarchical_query, non_q_hierarchical_query, q_hierarchical_query.ancestor_names):
+                        if stats:
+                            stats.count("skipped_dependency")
+                        continue
+                    if pool and not homomorphic.pop((q_hierarchical_query, non_q_hierarchical_query)):
+                        if stats:
+                            stats.count("rejected_by_prefetch")
+                        continue
+                    if stats:
+                        stats.count("homomorphism_checks")
+                        start = time.perf_counter()
+                        new_query = is_homomorphism(q_hierarchical_query, non_q_hierarchical_query)
+                        stats.add_time("is_homomorphism", time.perf_counter() - start)
                     else:
-                        new_non_q_hierarchical.add(new_query)
+                        new_query = is_homomorphism(q_hierarchical_query, non_q_hierarchical_query)
+                    if new_query:
+                        if stats:
+                            stats.count("homomorphisms_found")
+                        new_query.dependant_on.add(q_hierarchical_query)
+                        new_query.dependant_on.update(non_q_hierarchical_query.dependant_on)
+                        if new_query.is_q_hierarchical():
+                            new_q_hierarchical.add(new_query)
+                            exhausted.discard(q_hierarchical_query)
+                            if stats:
+                                stats.count("early_breaks")
+                            break
+                        else:
+                            new_non_q_hierarchical.add(new_query)
+        if stats:
+            stats.count("new_q_hierarchical", len(new_q_hierarchical))
+            stats.count("new_non_q_hierarchical", len(new_non_q_hierarchical))
 
         res.update(new_q_hierarchical)
         if len(queries) <= len(res):
-            compatible = list(map(lambda x: QuerySet(x), filter(lambda x: len(x) == len(queries), find_compatible_reductions(list(res)))))
-            if len(compatible) > 0:
-                return compatible[0]
+            with phase("reduction", round=round_nr, options=len(res)):
+                reduction = choose_reduction(list(res), len(queries), reduction_search, catalog, max_candidates)
+            if stats:
+                stats.count("reduction_searches")
+            if reduction:
+                return reduction
 
         if len(new_q_hierarchical) + len(new_non_q_hierarchical) == 0:
             return None
+        delta_non_q_hierarchical = new_non_q_hierarchical.difference(non_q_hierarchical)
         non_q_hierarchical.update(new_non_q_hierarchical)   # todo could this lead to double solutions?
+        for query in delta_non_q_hierarchical:
+            relation_name_index.add(query)
         q_hierarchical.update(new_q_hierarchical)
-
-
-
@@ -0,0 +1,46 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from Catalog import Catalog
+    from JoinOrderNode import JoinOrderNode
+    from Query import QuerySet
+
+
+def _nodes(root: "JoinOrderNode", res: "dict[int, JoinOrderNode]"):
+    if id(root) in res:
+        return
+    res[id(root)] = root
+    for child in root.children:
+        _nodes(child, res)
+
+
+def maintenance_cost(query_set: "QuerySet", catalog: "Catalog|None" = None) -> "dict":
+    # what keeping every view of the query set up to date costs: a tuple of a base relation updates every map
+    # above it, including the maps of downstream queries reading a view over it. Without a catalog a map update
+    # costs one per key variable plus one, with a catalog its estimated size, and every base relation is weighed
+    # by its row count. The trees are those of the variable orders the catalog leads to
+    nodes: "dict[int, JoinOrderNode]" = {}
+    for _, join_order in query_set.join_orders(share_views=True, catalog=catalog):
+        _nodes(join_order, nodes)
+    updates: "dict[str, int]" = {}
+    update_cost: "dict[str, float]" = {}
+    width = 0
+    base_relations = {}
+    for node in nodes.values():
+        width += len(node.free_variables)
+        if catalog is not None:
+            size = catalog.view_size(node.all_relations(), node.free_variables)
+        else:
+            size = 1 + len(node.free_variables)
+        for rel in node.all_relations(source_only=True):
+            base_relations.setdefault(rel.name, rel)
+        for name in {rel.name for rel in node.all_relations(source_only=True)}:
+            updates[name] = updates.get(name, 0) + 1
+            update_cost[name] = update_cost.get(name, 0.0) + size
+    total = 0.0
+    for name, node_cost in update_cost.items():
+        total += node_cost * (catalog.row_count(base_relations[name]) if catalog is not None else 1)
+    return {"views": len(nodes),
+            "width": width,
+            "updates_per_tuple": dict(sorted(updates.items())),
+            "cost": total}
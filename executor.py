@@ -0,0 +1,114 @@
+import time
+from typing import TYPE_CHECKING, Sequence
+
+if TYPE_CHECKING:
+    from JoinOrderNode import JoinOrderNode
+    from Relation import Relation
+
+
+class View:
+    __slots__ = ("variables", "tuples")
+
+    def __init__(self, variables: "tuple[str, ...]", tuples: "dict[tuple, int]"):
+        # multiplicity of every key over variables, in the count ring
+        self.variables = variables
+        self.tuples = tuples
+
+    def __len__(self):
+        return len(self.tuples)
+
+    def __repr__(self):
+        return f"View({','.join(self.variables)}: {len(self.tuples)} keys)"
+
+
+def relation_view(rel: "Relation", data: "dict[str, Sequence[Sequence]]") -> "View":
+    # data maps a relation name to its columns, in the order of the relation's variables. A view relation
+    # without data of its own is computed from its sources
+    if rel.name not in data and rel.sources:
+        return group(join([relation_view(source, data) for source in rel.sources]), tuple(dict.fromkeys(rel.free_variables)))
+    columns = data[rel.name]
+    variables = tuple(dict.fromkeys(rel.free_variables))
+    positions = [rel.free_variables.index(var) for var in variables]
+    # a variable occurring twice only keeps the rows agreeing on it
+    repeated = [(i, rel.free_variables.index(var)) for i, var in enumerate(rel.free_variables) if rel.free_variables.index(var) != i]
+    tuples: "dict[tuple, int]" = {}
+    for row in zip(*columns[:len(rel.free_variables)]):
+        if repeated and any(row[i] != row[j] for i, j in repeated):
+            continue
+        key = tuple(row[i] for i in positions)
+        tuples[key] = tuples.get(key, 0) + 1
+    return View(variables, tuples)
+
+
+def join_pair(a: "View", b: "View") -> "View":
+    if len(b) < len(a):
+        a, b = b, a
+    shared = [var for var in a.variables if var in b.variables]
+    a_shared = [a.variables.index(var) for var in shared]
+    b_shared = [b.variables.index(var) for var in shared]
+    b_rest = [i for i, var in enumerate(b.variables) if var not in shared]
+    index: "dict[tuple, list[tuple[tuple, int]]]" = {}
+    for key, count in a.tuples.items():
+        index.setdefault(tuple(key[i] for i in a_shared), []).append((key, count))
+    tuples: "dict[tuple, int]" = {}
+    for key, count in b.tuples.items():
+        matches = index.get(tuple(key[i] for i in b_shared))
+        if not matches:
+            continue
+        rest = tuple(key[i] for i in b_rest)
+        for a_key, a_count in matches:
+            joined = a_key + rest
+            tuples[joined] = tuples.get(joined, 0) + a_count * count
+    return View(a.variables + tuple(b.variables[i] for i in b_rest), tuples)
+
+
+def join(views: "list[View]") -> "View":
+    # hash joins, always with a view sharing variables with the result so far if there is one
+    if not views:
+        return View((), {(): 1})
+    pending = sorted(views, key=len)
+    res = pending.pop(0)
+    while pending:
+        next_view = next((x for x in pending if set(x.variables) & set(res.variables)), pending[0])
+        pending.remove(next_view)
+        res = join_pair(res, next_view)
+    return res
+
+
+def group(view: "View", variables: "tuple[str, ...]") -> "View":
+    # sums out every variable not in variables
+    if view.variables == variables:
+        return view
+    positions = [view.variables.index(var) for var in variables]
+    tuples: "dict[tuple, int]" = {}
+    for key, count in view.tuples.items():
+        projected = tuple(key[i] for i in positions)
+        tuples[projected] = tuples.get(projected, 0) + count
+    return View(variables, tuples)
+
+
+def execute(root: "JoinOrderNode", data: "dict[str, Sequence[Sequence]]") -> "tuple[View, list[dict]]":
+    # materializes every node of the tree bottom up, reporting per node its size and the time to build it from
+    # its already built children. Nodes shared by several parents are built once
+    built: "dict[int, View]" = {}
+    report: "list[dict]" = []
+
+    def build(node: "JoinOrderNode") -> "View":
+        if id(node) in built:
+            return built[id(node)]
+        inputs = [build(child) for child in node.children]
+        start = time.perf_counter()
+        inputs.extend(relation_view(rel, data) for rel in node.relations)
+        joined = join(inputs)
+        # free variables of ancestors the subtree does not mention leave the view constant, it is not keyed by them
+        view = group(joined, tuple(sorted(set(node.free_variables).intersection(joined.variables))))
+        report.append({"node": repr(node),
+                       "designation": node.designation,
+                       "free_variables": list(view.variables),
+                       "aggregated_variables": sorted(node.aggregated_variables),
+                       "size": len(view),
+                       "seconds": time.perf_counter() - start})
+        built[id(node)] = view
+        return view
+
+    return build(root), report
@@ -0,0 +1,109 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from Query import Query
+
+
+def join_variable_sets(query: "Query") -> "tuple[list[str], list[list[int]]]":
+    # same join variables as Query.is_q_hierarchical, with the indices of the atoms containing each of them
+    atoms = list(query.atoms)
+    occurrences: "dict[str, int]" = {}
+    for rel in atoms:
+        for var in rel.free_variables:
+            occurrences[var] = occurrences.get(var, 0) + 1
+    join_variables = [var for var, count in occurrences.items() if count > 1]
+    join_variables.extend(var for var in query.free_variables if occurrences.get(var, 0) <= 1)
+    var_index = {var: i for i, var in enumerate(join_variables)}
+    atom_sets: "list[list[int]]" = [[] for _ in join_variables]
+    for atom_index, rel in enumerate(atoms):
+        for var in set(rel.free_variables):
+            if var in var_index:
+                atom_sets[var_index[var]].append(atom_index)
+    return join_variables, atom_sets
+
+
+def q_hierarchical_batch(queries: "list[Query]", chunk_size: int = 512) -> "list[bool]":
+    import numpy as np
+
+    res: "list[bool|None]" = [None] * len(queries)
+    prepared = []
+    for i, query in enumerate(queries):
+        join_variables, atom_sets = join_variable_sets(query)
+        free = [var in query.free_variables for var in join_variables]
+        prepared.append((len(join_variables), len(query.atoms), i, atom_sets, free))
+    # similar shapes end up in the same chunk, which keeps the padding small
+    prepared.sort(key=lambda x: (x[0], x[1]))
+    for start in range(0, len(prepared), chunk_size):
+        chunk = prepared[start:start + chunk_size]
+        nr_vars = max(x[0] for x in chunk)
+        nr_atoms = max(x[1] for x in chunk)
+        incidence = np.zeros((len(chunk), nr_vars, nr_atoms), dtype=np.float32)
+        free = np.zeros((len(chunk), nr_vars), dtype=bool)
+        valid = np.zeros((len(chunk), nr_vars), dtype=bool)
+        for k, (n, _, _, atom_sets, is_free) in enumerate(chunk):
+            for v, atom_set in enumerate(atom_sets):
+                incidence[k, v, atom_set] = 1
+            free[k, :n] = is_free
+            valid[k, :n] = True
+        intersection = np.matmul(incidence, incidence.transpose(0, 2, 1))
+        size = incidence.sum(axis=2)
+        # subset[k, a, b]: the atoms of a are a subset of the atoms of b
+        subset = intersection == size[:, :, None]
+        disjoint = intersection == 0
+        violation = ~(subset | subset.transpose(0, 2, 1) | disjoint)
+        violation |= subset & free[:, :, None] & ~free[:, None, :]
+        violation &= valid[:, :, None] & valid[:, None, :]
+        violation &= ~np.eye(nr_vars, dtype=bool)[None, :, :]
+        q_hierarchical = ~violation.any(axis=(1, 2))
+        for k, x in enumerate(chunk):
+            res[x[2]] = bool(q_hierarchical[k])
+    for query, is_q_hierarchical in zip(queries, res):
+        query._is_q_hierarchical = is_q_hierarchical
+    return res
+
+
+def q_hierarchy_witness(query: "Query") -> "tuple[str, str]|None":
+    # None if the query is q-hierarchical, otherwise a pair of join variables Query.is_q_hierarchical rejects:
+    # either their atom sets overlap without one containing the other, or the first is free and its atom
+    # set is contained in the atom set of the second, which is not free
+    join_variables, atom_sets = join_variable_sets(query)
+    groups: "dict[frozenset[int], list[str]]" = {}
+    for var, atom_set in zip(join_variables, atom_sets):
+        groups.setdefault(frozenset(atom_set), []).append(var)
+    for group in groups.values():
+        free = [var for var in group if var in query.free_variables]
+        if free and len(free) < len(group):
+            return free[0], next(var for var in group if var not in query.free_variables)
+    # free variables without atoms are contained in every atom set
+    unused = groups.pop(frozenset(), None)
+    if unused:
+        bound = next((group[0] for group in groups.values() if group[0] not in query.free_variables), None)
+        if bound is not None:
+            return unused[0], bound
+
+    # larger sets first: a set's parent is the smallest inserted set containing it, which must then be the
+    # smallest set containing any of its atoms
+    owner: "dict[int, frozenset[int]]" = {}
+    bound_above: "dict[frozenset[int], str|None]" = {}
+    for atom_set in sorted(groups, key=len, reverse=True):
+        owners = {owner.get(atom) for atom in atom_set}
+        if len(owners) > 1:
+            overlapping = next(x for x in owners if x is not None and not atom_set.issubset(x))
+            return groups[atom_set][0], groups[overlapping][0]
+        parent = owners.pop()
+        inherited = bound_above[parent] if parent is not None else None
+        var = groups[atom_set][0]
+        if var in query.free_variables:
+            if inherited is not None:
+                return var, inherited
+            bound_above[atom_set] = None
+        else:
+            bound_above[atom_set] = var
+        for atom in atom_set:
+            owner[atom] = atom_set
+    return None
+
+
+def is_q_hierarchical_laminar(query: "Query") -> bool:
+    query._is_q_hierarchical = q_hierarchy_witness(query) is None
+    return query._is_q_hierarchical
@@ -8,6 +8,7 @@ from QueryGenerator import generate
 from Relation import Relation
 from Query import Query, QuerySet
 from cascade import run
+from sweep import GENERATOR_ARGS, sweep, workload_states
 
 random.seed(22)
 
@@ -155,41 +156,22 @@ def example_5():
     # qs.graph_viz()
     return
 
-def example_6(nr_attempts: int, seed_base = 23445, _print = False, _break = False):
-    nr_valid = 0
-    nr_run_success = 0
-    nr_greedy_success = 0
-    random.seed(seed_base)
-    for _ in range(nr_attempts):
-        resi: "list[Query]" = generate(nr_queries=3,
-                        avg_nr_relations=3,
-                        std_nr_relations=2,
-                        avg_total_relations=5,
-                        std_total_relations=2,
-                        avg_nr_variables=4,
-                        std_nr_variables=1,
-                        avg_total_variables=7,
-                        std_total_variables=3,
-                        seed=seed_base + _
-                        )
-        q_hierarchical = map(lambda x: x.is_q_hierarchical(), resi)
-        not_q_hierarchical = map(lambda x: not x, q_hierarchical)
-        if any(q_hierarchical) and any(not_q_hierarchical):
-            if _ % 100 == 0:
-                print(_)
-
-            nr_valid += 1
-            for q in resi:
-                for rel in q.relations:
-                    rel.index = -1
-            res_run_1 = run(resi)
-            if res_run_1:
-                nr_run_success += 1
-                if _print:
-                    print(f"Success on {_}")
-                    res_run_1.graph_viz(_)
-
-    print(f"{nr_attempts} groups generated, {nr_valid} valid, {nr_run_success} successfull reduction")
+def example_6(nr_attempts: int, seed_base = 23445, _print = False, _break = False, checkpoint_path = "example_6.jsonl"):
+    seeds = list(range(seed_base, seed_base + nr_attempts))
+    summary, results = sweep(seeds, checkpoint_path, _print=True, rng_seed=seed_base)
+    if _print:
+        states = workload_states(seeds, seed_base, GENERATOR_ARGS)
+        for entry in results:
+            if entry["success"]:
+                print(f"Success on {entry['seed'] - seed_base}")
+                random.setstate(states[entry["seed"]])
+                resi = generate(**GENERATOR_ARGS, seed=entry["seed"])
+                for q in resi:
+                    for rel in q.relations:
+                        rel.index = -1
+                res_run_1 = run(resi)
+                res_run_1.graph_viz(entry["seed"] - seed_base)
+    return summary
 
 def example_7():
     Census = Relation("Census", [
@@ -312,11 +294,15 @@ def example_7():
     # else:
     #     print("no reduction")
 
-def example_8():
+def example_8(checkpoint_path = "example_8.jsonl"):
+    # every seed_base is drawn after the previous one reseeded the random state and generated its workload
+    seeds = []
     for i in range(1000,2000):
         seed_base =random.randint(16029,50000)
-        print(seed_base)
-        example_6(1, seed_base)
+        seeds.append(seed_base)
+        random.seed(seed_base)
+        generate(**GENERATOR_ARGS, seed=seed_base)
+    return sweep(seeds, checkpoint_path)
 
 def example_9():
     R0 = Relation("R0", ["a", "c"])
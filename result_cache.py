@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import TYPE_CHECKING
+
+import cascade
+from Query import Query, QuerySet
+from Relation import Relation
+
+if TYPE_CHECKING:
+    from Catalog import Catalog
+
+# bump when stored results must not be reused although the sources below did not change
+CACHE_VERSION = 1
+# the modules deciding the result of cascade.run, including the cost estimates and trees "cheapest" ranks by
+SEARCH_MODULES = ["cascade.py", "Helpers.py", "Query.py", "Relation.py", "cost.py", "symbols.py", "Catalog.py",
+                  "VariableOrder.py", "JoinOrderNode.py"]
+
+
+def code_version() -> str:
+    digest = hashlib.sha256(str(CACHE_VERSION).encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in SEARCH_MODULES:
+        with open(os.path.join(directory, module), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def canonical_query(query: "Query") -> "tuple[str, dict[str, str]]":
+    # the query with variables renamed in order of first occurrence over its relations sorted by name and by how
+    # often each position's variable occurs in the query, together with that renaming. Queries equal up to variable
+    # names usually get the same string, different queries never do
+    occurrences: "dict[str, int]" = {}
+    for rel in query.relations:
+        for var in rel.free_variables:
+            occurrences[var] = occurrences.get(var, 0) + 1
+    relations = sorted(query.relations, key=lambda x: (x.name, tuple(occurrences[var] for var in x.free_variables),
+                                                       tuple(x.free_variables.index(var) for var in x.free_variables)))
+    var_map: "dict[str, str]" = {}
+    for rel in relations:
+        for var in rel.free_variables:
+            var_map.setdefault(var, f"v{len(var_map)}")
+    for var in sorted(query.free_variables.difference(var_map)):
+        var_map[var] = f"v{len(var_map)}"
+    text = ";".join(f"{rel.name}({','.join(var_map[var] for var in rel.free_variables)})" for rel in relations)
+    return f"{text}|{','.join(sorted(var_map[var] for var in query.free_variables))}", var_map
+
+
+def catalog_digest(catalog: "Catalog|None") -> "str|None":
+    if catalog is None:
+        return None
+    stats = [(x.name, x.row_count, x.distinct_counts, x.heavy_hitters)
+             for x in sorted(catalog.relations.values(), key=lambda x: x.name)]
+    return hashlib.sha256(json.dumps([catalog.default_row_count, stats]).encode()).hexdigest()
+
+
+class Canonical:
+    def __init__(self, queries: "list[Query]", run_args: "dict"):
+        forms = [(canonical_query(query), query) for query in queries]
+        forms.sort(key=lambda x: x[0][0])
+        self.query_names: "dict[str, str]" = {}
+        self.var_maps: "dict[str, dict[str, str]]" = {}
+        for i, ((_, var_map), query) in enumerate(forms):
+            self.query_names[query.name] = f"q{i}"
+            self.var_maps[query.name] = var_map
+        # query names are what ties views and dependencies to their queries
+        self.valid = len(self.query_names) == len(queries)
+        text = json.dumps([[form for (form, _), _ in forms], sorted(run_args.items())])
+        self.fingerprint = hashlib.sha256(text.encode()).hexdigest()
+        self.original_names = {canonical: name for name, canonical in self.query_names.items()}
+        self.original_vars = {self.query_names[name]: {v: k for k, v in var_map.items()} for name, var_map in self.var_maps.items()}
+        # results reuse the caller's base relation objects, as cascade.run does
+        self.base_relations = {(rel.name, tuple(rel.free_variables)): rel for query in queries for rel in query.relations}
+
+
+def _dump_relation(rel: "Relation", names: "dict[str, str]", var_map: "dict[str, str]") -> "dict":
+    name = f"V_{names[rel.name[2:]]}" if rel.sources else rel.name
+    return {"name": name,
+            "variables": [var_map[var] for var in rel.free_variables],
+            "sources": [_dump_relation(source, names, var_map) for source in rel.sources]}
+
+
+def _load_relation(entry: "dict", canonical: "Canonical", var_map: "dict[str, str]") -> "Relation":
+    variables = [var_map[var] for var in entry["variables"]]
+    if not entry["sources"]:
+        rel = canonical.base_relations.get((entry["name"], tuple(variables)))
+        return rel if rel is not None else Relation(entry["name"], variables)
+    return Relation(f"V_{canonical.original_names[entry['name'][2:]]}", tuple(variables),
+                    [_load_relation(source, canonical, var_map) for source in entry["sources"]])
+
+
+def dump_query_set(query_set: "QuerySet|None", canonical: "Canonical") -> "str":
+    if query_set is None:
+        return json.dumps(None)
+    # every query once, with its dependencies as indices, the rewritten ancestors need not be in the set
+    queries: "list[Query]" = []
+    index: "dict[int, int]" = {}
+
+    def visit(query: "Query"):
+        if id(query) in index:
+            return
+        index[id(query)] = len(queries)
+        queries.append(query)
+        for dep in query.dependant_on:
+            visit(dep)
+
+    for query in sorted(query_set.queries, key=lambda x: canonical.query_names[x.name]):
+        visit(query)
+    entries = []
+    for query in queries:
+        var_map = canonical.var_maps[query.name]
+        names = canonical.query_names
+        entries.append({"name": names[query.name],
+                        "free_variables": sorted(var_map[var] for var in query.free_variables),
+                        "relations": [_dump_relation(rel, names, var_map) for rel in query.relations],
+                        "atoms": [_dump_relation(rel, names, var_map) for rel in query.atoms],
+                        "dependant_on": sorted(index[id(dep)] for dep in query.dependant_on)})
+    return json.dumps({"queries": entries, "result": sorted(index[id(query)] for query in query_set.queries),
+                       "cost": query_set.cost})
+
+
+def load_query_set(text: str, canonical: "Canonical") -> "QuerySet|None":
+    stored = json.loads(text)
+    if stored is None:
+        return None
+    queries = []
+    for entry in stored["queries"]:
+        var_map = canonical.original_vars[entry["name"]]
+        relations = {_load_relation(rel, canonical, var_map) for rel in entry["relations"]}
+        atoms = {_load_relation(rel, canonical, var_map) for rel in entry["atoms"]}
+        queries.append(Query(canonical.original_names[entry["name"]], relations, {var_map[var] for var in entry["free_variables"]}, atoms))
+    for query, entry in zip(queries, stored["queries"]):
+        query.dependant_on.update(queries[i] for i in entry["dependant_on"])
+    res = QuerySet({queries[i] for i in stored["result"]})
+    res.cost = stored["cost"]
+    return res
+
+
+class ResultCache:
+    def __init__(self, path: str = "cascade_cache.sqlite", version: "str|None" = None):
+        self.path = path
+        self.version = version if version else code_version()
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                "(fingerprint TEXT PRIMARY KEY, version TEXT, result TEXT, created REAL)")
+        # entries of other code versions are never read again
+        self.connection.execute("DELETE FROM results WHERE version != ?", (self.version,))
+        self.connection.commit()
+
+    def run(self, queries: "list[Query]", **run_args) -> "QuerySet|None":
+        # cascade.run(queries, **run_args), answered from the cache when an equal workload was run before, up to
+        # the names of queries and variables. Instrumented runs always search. Unlike cascade.run, which adds join
+        # variables to the free variables of its input queries, the caller's queries are left as they are, on a
+        # hit as well as on a miss
+        queries = [Query(query.name, query.relations, set(query.free_variables), query.atoms) for query in queries]
+        if run_args.get("stats") is not None:
+            return cascade.run(queries, **run_args)
+        # workers and semi_naive only change how the same result is found
+        search_args = {"reduction_search": run_args.get("reduction_search", "exact_cover"),
+                       "catalog": catalog_digest(run_args.get("catalog"))}
+        if search_args["reduction_search"] == "cheapest":
+            search_args["max_candidates"] = run_args.get("max_candidates", 64)
+        canonical = Canonical(queries, search_args)
+        if not canonical.valid:
+            return cascade.run(queries, **run_args)
+        row = self.connection.execute("SELECT result FROM results WHERE fingerprint = ? AND version = ?",
+                                      (canonical.fingerprint, self.version)).fetchone()
+        if row is not None:
+            self.hits += 1
+            return load_query_set(row[0], canonical)
+        self.misses += 1
+        res = cascade.run(queries, **run_args)
+        self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                (canonical.fingerprint, self.version, dump_query_set(res, canonical), time.time()))
+        self.connection.commit()
+        return res
+
+    def clear(self):
+        self.connection.execute("DELETE FROM results")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def stats(self):
+        size = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size, "version": self.version}
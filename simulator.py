@@ -0,0 +1,155 @@
+import sys
+import time
+from typing import TYPE_CHECKING, Iterable
+
+from executor import View, group, join, relation_view
+
+if TYPE_CHECKING:
+    from JoinOrderNode import JoinOrderNode
+    from Query import QuerySet
+    from Relation import Relation
+
+
+def add_into(view: "View", delta: "View"):
+    tuples = view.tuples
+    for key, count in delta.tuples.items():
+        count += tuples.get(key, 0)
+        if count:
+            tuples[key] = count
+        else:
+            del tuples[key]
+
+
+def view_bytes(view: "View") -> int:
+    return sys.getsizeof(view.tuples) + sum(map(sys.getsizeof, view.tuples))
+
+
+class RelationState:
+    def __init__(self, rel: "Relation"):
+        self.rel = rel
+        self.view = View(tuple(dict.fromkeys(rel.free_variables)), {})
+        # a view relation V_Qx is maintained from its sources. The generated M3 reads the root map of Qx instead,
+        # whose ring values carry the variables the count ring sums out, so these states duplicate what the
+        # upstream query maintains
+        self.sources = [RelationState(source) for source in rel.sources]
+
+    def apply(self, name: str, rows: "list[tuple]", sign: int) -> "list[View]":
+        # the deltas of this relation for a batch on base relation name, one per occurrence of name, each to be
+        # propagated before the next one
+        res = []
+        if not self.sources:
+            if self.rel.name == name and rows:
+                delta = relation_view(self.rel, {name: list(zip(*rows))})
+                if sign < 0:
+                    delta = View(delta.variables, {key: -count for key, count in delta.tuples.items()})
+                add_into(self.view, delta)
+                res.append(delta)
+            return res
+        for i, source in enumerate(self.sources):
+            for source_delta in source.apply(name, rows, sign):
+                others = [x.view for j, x in enumerate(self.sources) if j != i]
+                delta = group(join([source_delta] + others), self.view.variables)
+                add_into(self.view, delta)
+                res.append(delta)
+        return res
+
+    def views(self) -> "list[View]":
+        return [self.view] + [view for source in self.sources for view in source.views()]
+
+
+class DeltaSimulator:
+    def __init__(self, roots: "list[JoinOrderNode]"):
+        # roots may share subtrees, as after JoinOrderNode.share_subtrees
+        self.roots = roots
+        self.nodes: "dict[int, JoinOrderNode]" = {}
+        self.parents: "dict[int, list[JoinOrderNode]]" = {}
+        self.views: "dict[int, View]" = {}
+        self.relations: "dict[int, list[RelationState]]" = {}
+        # base relation name to the nodes reading it, directly or through a view relation
+        self.readers: "dict[str, list[int]]" = {}
+        for root in roots:
+            self._register(root)
+        self.updates = 0
+        self.seconds = 0.0
+        self.peak_view_keys = 0
+        self.peak_view_bytes = 0
+        # the states of view relations, not part of the peaks as the M3 triggers do not keep them
+        self.peak_rebuilt_view_keys = 0
+
+    @staticmethod
+    def for_query_set(query_set: "QuerySet", share_views: bool = True) -> "DeltaSimulator":
+        return DeltaSimulator([join_order for _, join_order in query_set.join_orders(share_views)])
+
+    def _register(self, node: "JoinOrderNode"):
+        if id(node) in self.nodes:
+            return
+        self.nodes[id(node)] = node
+        self.parents.setdefault(id(node), [])
+        variables = {var for rel in node.all_relations() for var in rel.free_variables}
+        self.views[id(node)] = View(tuple(sorted(set(node.free_variables).intersection(variables))), {})
+        self.relations[id(node)] = [RelationState(rel) for rel in node.relations]
+        for name in {source.name for rel in node.relations for source in rel.root_sources()}:
+            self.readers.setdefault(name, []).append(id(node))
+        for child in node.children:
+            self._register(child)
+            self.parents[id(child)].append(node)
+
+    def view(self, node: "JoinOrderNode") -> "View":
+        return self.views[id(node)]
+
+    def apply(self, name: str, rows: "list[tuple]", sign: int = 1):
+        # rows of base relation name, in the order of its columns, inserted with sign 1 and deleted with -1
+        start = time.perf_counter()
+        for node_id in self.readers.get(name, []):
+            node = self.nodes[node_id]
+            states = self.relations[node_id]
+            for i, state in enumerate(states):
+                for delta in state.apply(name, rows, sign):
+                    inputs = [self.views[id(child)] for child in node.children]
+                    inputs.extend(x.view for j, x in enumerate(states) if j != i)
+                    self._propagate(node, delta, inputs)
+        self.seconds += time.perf_counter() - start
+        self.updates += len(rows)
+        self._measure()
+
+    def _propagate(self, node: "JoinOrderNode", delta: "View", others: "list[View]"):
+        # same path the triggers take: from the changed input up to every root above it
+        view = self.views[id(node)]
+        node_delta = group(join([delta] + others), view.variables)
+        if not node_delta.tuples:
+            return
+        add_into(view, node_delta)
+        for parent in self.parents[id(node)]:
+            inputs = [self.views[id(child)] for child in parent.children if child is not node]
+            inputs.extend(x.view for x in self.relations[id(parent)])
+            self._propagate(parent, node_delta, inputs)
+
+    def insert(self, name: str, rows: "list[tuple]"):
+        self.apply(name, rows, 1)
+
+    def delete(self, name: str, rows: "list[tuple]"):
+        self.apply(name, rows, -1)
+
+    def run(self, batches: "Iterable[tuple[str, str, list[tuple]]]") -> "dict":
+        # batches of (operator, relation name, rows), operator "+" or "-" as in the M3 triggers
+        for operator, name, rows in batches:
+            self.apply(name, rows, -1 if operator == "-" else 1)
+        return self.report()
+
+    def _measure(self):
+        states = [state for node_states in self.relations.values() for state in node_states]
+        views = list(self.views.values()) + [state.view for state in states if not state.sources]
+        self.peak_view_keys = max(self.peak_view_keys, sum(map(len, views)))
+        self.peak_view_bytes = max(self.peak_view_bytes, sum(map(view_bytes, views)))
+        rebuilt = [view for state in states if state.sources for view in state.views()]
+        self.peak_rebuilt_view_keys = max(self.peak_rebuilt_view_keys, sum(map(len, rebuilt)))
+
+    def report(self) -> "dict":
+        return {"updates": self.updates,
+                "seconds": self.seconds,
+                "updates_per_second": self.updates / self.seconds if self.seconds else 0.0,
+                "maintained_views": len(self.views),
+                "peak_view_keys": self.peak_view_keys,
+                "peak_view_bytes": self.peak_view_bytes,
+                "rebuilt_view_relations": sum(1 for states in self.relations.values() for state in states if state.sources),
+                "peak_rebuilt_view_keys": self.peak_rebuilt_view_keys}
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import random
+import signal
+import statistics
+import time
+from multiprocessing import Pool
+
+from QueryGenerator import generate
+from cascade import run
+import symbols
+
+GENERATOR_ARGS = {
+    "nr_queries": 3,
+    "avg_nr_relations": 3,
+    "std_nr_relations": 2,
+    "avg_total_relations": 5,
+    "std_total_relations": 2,
+    "avg_nr_variables": 4,
+    "std_nr_variables": 1,
+    "avg_total_variables": 7,
+    "std_total_variables": 3,
+}
+
+
+def workload_states(seeds: "list[int]", rng_seed: int, generator_args: "dict[str, float]") -> "dict[int, tuple]":
+    # the global random state each seed's generate() starts from when it is seeded once with rng_seed and runs
+    # through the workloads of the seeds in order, as the serial example_6 loop did. Generating is cheap next to
+    # cascade.run, so the parent walks the sequence and the workers only restore their state
+    random.seed(rng_seed)
+    res = {}
+    for seed in seeds:
+        res[seed] = random.getstate()
+        generate(**generator_args, seed=seed)
+    return res
+
+
+def run_seed(seed: int, generator_args: "dict[str, float]", state: "tuple|None" = None) -> "dict":
+    # generate() also draws from the global random state, so every seed starts from its own, or from the state
+    # workload_states recorded for it
+    if state is None:
+        random.seed(seed)
+    else:
+        random.setstate(state)
+    # nothing of the previous seed is used any more, a worker would otherwise keep every id it ever handed out
+    symbols.reset()
+    start = time.perf_counter()
+    resi = generate(**generator_args, seed=seed)
+    q_hierarchical = map(lambda x: x.is_q_hierarchical(), resi)
+    not_q_hierarchical = map(lambda x: not x, q_hierarchical)
+    valid = any(q_hierarchical) and any(not_q_hierarchical)
+    success = False
+    if valid:
+        for q in resi:
+            for rel in q.relations:
+                rel.index = -1
+        success = run(resi) is not None
+    return {"seed": seed, "valid": valid, "success": success, "time": time.perf_counter() - start}
+
+
+def _run_seed(task: "tuple[int, dict[str, float], tuple|None]"):
+    seed, generator_args, state = task
+    try:
+        return run_seed(seed, generator_args, state)
+    except Exception as e:
+        return {"seed": seed, "error": repr(e)}
+
+
+def _ignore_interrupt():
+    # Ctrl-C is handled by the parent, which tears the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def load_checkpoint(checkpoint_path: str, rng_seed: "int|None" = None) -> "dict[int, dict]":
+    # only entries of the same random sequence, the same seed gives another workload in the other one
+    res = {}
+    if not os.path.exists(checkpoint_path):
+        return res
+    with open(checkpoint_path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:  # line cut short by a kill
+                continue
+            if "error" not in entry and entry.get("rng_seed") == rng_seed:
+                res[entry["seed"]] = entry
+    return res
+
+
+def sweep(seeds: "list[int]",
+          checkpoint_path: str,
+          workers: "int|None" = None,
+          generator_args: "dict[str, float]|None" = None,
+          _print: bool = True,
+          rng_seed: "int|None" = None):
+    # with rng_seed the workloads are those of one random sequence seeded with it, otherwise every seed reseeds
+    # the random state itself. A repeated seed then gives the same workload again, it is run once but counted
+    # every time it occurs, as the serial loops did
+    generator_args = generator_args if generator_args else GENERATOR_ARGS
+    if rng_seed is not None and len(set(seeds)) != len(seeds):
+        raise ValueError("seeds must be distinct with rng_seed, a repeated seed starts from another random state")
+    states = workload_states(seeds, rng_seed, generator_args) if rng_seed is not None else {}
+    done = load_checkpoint(checkpoint_path, rng_seed)
+    todo = [seed for seed in dict.fromkeys(seeds) if seed not in done]
+    if _print and done:
+        print(f"resuming: {len(done)} seeds already done, {len(todo)} to go")
+    with open(checkpoint_path, "a") as checkpoint, Pool(workers, initializer=_ignore_interrupt) as pool:
+        for entry in pool.imap_unordered(_run_seed, [(seed, generator_args, states.get(seed)) for seed in todo]):
+            if rng_seed is not None:
+                entry["rng_seed"] = rng_seed
+            checkpoint.write(json.dumps(entry) + "\n")
+            checkpoint.flush()
+            if "error" in entry:
+                if _print:
+                    print(f"Seed {entry['seed']} failed: {entry['error']}")
+            else:
+                done[entry["seed"]] = entry
+    results = [done[seed] for seed in seeds if seed in done]
+    summary = summarize(results)
+    if _print:
+        print_summary(summary)
+    return summary, results
+
+
+def summarize(results: "list[dict]"):
+    timings = [x["time"] for x in results]
+    return {
+        "nr_attempts": len(results),
+        "nr_valid": sum(1 for x in results if x["valid"]),
+        "nr_run_success": sum(1 for x in results if x["success"]),
+        "total_time": sum(timings),
+        "mean_time": statistics.mean(timings) if timings else 0.0,
+        "max_time": max(timings, default=0.0),
+        "slowest_seed": max(results, key=lambda x: x["time"])["seed"] if results else None,
+    }
+
+
+def print_summary(summary: "dict"):
+    print(f"{summary['nr_attempts']} groups generated, {summary['nr_valid']} valid, {summary['nr_run_success']} successfull reduction")
+    print(f"{summary['total_time']:.2f}s total, {summary['mean_time'] * 1000:.2f}ms mean, "
+          f"{summary['max_time'] * 1000:.2f}ms max (seed {summary['slowest_seed']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run cascade.run over generated workloads, resumable")
+    parser.add_argument("checkpoint", help="JSON lines file of completed seeds, appended to and resumed from")
+    parser.add_argument("--seed-base", type=int, default=23445)
+    parser.add_argument("--attempts", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--reseed", action="store_true",
+                        help="seed the random state per seed instead of once with the seed base, as example_6 does")
+    for name, value in GENERATOR_ARGS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int if name == "nr_queries" else float, default=value)
+    args = parser.parse_args()
+    sweep(list(range(args.seed_base, args.seed_base + args.attempts)),
+          args.checkpoint,
+          args.workers,
+          {name: getattr(args, name) for name in GENERATOR_ARGS},
+          rng_seed=None if args.reseed else args.seed_base)
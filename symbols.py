@@ -0,0 +1,44 @@
+class SymbolTable:
+    def __init__(self, maxsize: "int|None" = None):
+        self._ids: "dict[object, int]" = {}
+        self.maxsize = maxsize
+        # bumped by clear, ids handed out in an earlier generation are stale
+        self.generation = 0
+
+    def intern(self, key) -> int:
+        # dense ids in order of first appearance, equal keys share an id. A full table starts a new generation
+        res = self._ids.get(key)
+        if res is None:
+            if self.maxsize is not None and len(self._ids) >= self.maxsize:
+                self.clear()
+            res = self._ids[key] = len(self._ids)
+        return res
+
+    def __len__(self):
+        return len(self._ids)
+
+    def clear(self):
+        self._ids.clear()
+        self.generation += 1
+
+
+MAX_SYMBOLS = 1 << 20
+
+# Relation, Query and QuerySet compare their structural keys, the ids are only a shortcut between objects of one
+# generation. Every object whose cached ids come from these tables checks their generation before using them, so
+# the tables can be cleared at any time
+relation_names = SymbolTable(MAX_SYMBOLS)
+# (relation name, column index)
+positions = SymbolTable(MAX_SYMBOLS)
+relations = SymbolTable(MAX_SYMBOLS)
+queries = SymbolTable(MAX_SYMBOLS)
+query_sets = SymbolTable(MAX_SYMBOLS)
+# bit positions for the ancestor masks, only handed out to queries that take part in a dependency closure. Not
+# bounded, the masks of one cascade.run have to come from one generation
+query_bits = SymbolTable()
+
+
+def reset():
+    # forgets every id, e.g. between the workloads of a sweep so the tables do not grow with every workload
+    for table in (relation_names, positions, relations, queries, query_sets, query_bits):
+        table.clear()
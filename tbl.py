@@ -0,0 +1,323 @@
+import hashlib
+import json
+import math
+import mmap
+import os
+from collections import Counter
+from contextlib import nullcontext
+from multiprocessing import Pool
+from typing import TYPE_CHECKING
+
+from Catalog import Catalog, RelationStatistics
+
+if TYPE_CHECKING:
+    from M3Generator import M3Generator, M3Relation
+
+CATALOG_FILE = "catalog.json"
+CATALOG_VERSION = 1
+CHUNK_SIZE = 64 << 20
+HEAVY_HITTERS = 16
+# distinct values are counted exactly up to this many, then estimated by a HyperLogLog sketch
+EXACT_DISTINCT_LIMIT = 1 << 16
+HLL_BITS = 14
+
+
+def table_path(dataset_dir: str, relation_name: str) -> str:
+    # same file M3Relation.generate_source reads
+    return os.path.join(dataset_dir, f"{relation_name.capitalize()}.tbl")
+
+
+def _hash(value: bytes) -> int:
+    # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "little")
+
+
+class DistinctCounter:
+    def __init__(self):
+        self.hashes: "set[int]|None" = set()
+        self.registers: "bytearray|None" = None
+
+    def add_all(self, values: "set[bytes]"):
+        if self.hashes is not None:
+            self.hashes.update(map(_hash, values))
+            if len(self.hashes) > EXACT_DISTINCT_LIMIT:
+                self._to_sketch()
+        else:
+            self._add_hashes(map(_hash, values))
+
+    def _to_sketch(self):
+        self.registers = bytearray(1 << HLL_BITS)
+        self._add_hashes(self.hashes)
+        self.hashes = None
+
+    def _add_hashes(self, hashes):
+        registers = self.registers
+        for h in hashes:
+            index = h >> (64 - HLL_BITS)
+            rest = h & ((1 << (64 - HLL_BITS)) - 1)
+            rank = 64 - HLL_BITS - rest.bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other: "DistinctCounter"):
+        if self.hashes is not None and other.hashes is not None:
+            self.hashes.update(other.hashes)
+            if len(self.hashes) > EXACT_DISTINCT_LIMIT:
+                self._to_sketch()
+            return
+        if self.hashes is not None:
+            self._to_sketch()
+        if other.hashes is not None:
+            self._add_hashes(other.hashes)
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        if self.hashes is not None:
+            return len(self.hashes)
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -x for x in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+def _top(counter: "Counter[bytes]", k: int) -> "Counter[bytes]":
+    # Misra-Gries: keep the k largest counts, lowered by the next largest, so merged summaries stay lower bounds
+    if len(counter) <= k:
+        return counter
+    ranked = counter.most_common(k + 1)
+    cut = ranked[k][1]
+    return Counter({value: count - cut for value, count in ranked[:k] if count > cut})
+
+
+class TableSummary:
+    def __init__(self, nr_columns: int = 0):
+        self.row_count = 0
+        self.distinct: "list[DistinctCounter]" = [DistinctCounter() for _ in range(nr_columns)]
+        self.heavy_hitters: "list[Counter[bytes]]" = [Counter() for _ in range(nr_columns)]
+
+    def _widen(self, nr_columns: int):
+        while len(self.distinct) < nr_columns:
+            self.distinct.append(DistinctCounter())
+            self.heavy_hitters.append(Counter())
+
+    def add_rows(self, data: bytes):
+        columns: "list[list[bytes]]" = []
+        for line in data.split(b"\n"):
+            if not line:
+                continue
+            fields = line.rstrip(b"\r").split(b"|")
+            if fields[-1] == b"" and len(fields) > 1:  # dbgen style trailing delimiter
+                fields.pop()
+            while len(columns) < len(fields):
+                columns.append([])
+            for column, field in zip(columns, fields):
+                column.append(field)
+            self.row_count += 1
+        self._widen(len(columns))
+        for i, column in enumerate(columns):
+            counts = Counter(column)
+            self.distinct[i].add_all(counts.keys())
+            self.heavy_hitters[i] = _top(self.heavy_hitters[i] + counts, HEAVY_HITTERS)
+
+    def merge(self, other: "TableSummary"):
+        self.row_count += other.row_count
+        self._widen(len(other.distinct))
+        for i in range(len(other.distinct)):
+            self.distinct[i].merge(other.distinct[i])
+            self.heavy_hitters[i] = _top(self.heavy_hitters[i] + other.heavy_hitters[i], HEAVY_HITTERS)
+
+    def statistics(self, name: str) -> "RelationStatistics":
+        # the sketch can overshoot on small tables, a column never has more distinct values than rows
+        return RelationStatistics(name, self.row_count, [min(x.count(), self.row_count) for x in self.distinct],
+                                  [{value.decode(errors="replace"): count for value, count in x.most_common()}
+                                   for x in self.heavy_hitters])
+
+
+def chunk_bounds(path: str, chunk_size: int = CHUNK_SIZE) -> "list[tuple[int, int]]":
+    # byte ranges ending on line breaks
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    res = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while start < size:
+            end = data.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            res.append((start, end))
+            start = end
+    return res
+
+
+def scan_chunk(task: "tuple[str, int, int]") -> "TableSummary":
+    path, start, end = task
+    summary = TableSummary()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        summary.add_rows(data[start:end])
+    return summary
+
+
+def scan_table(path: str, name: str, pool: "Pool|None" = None, chunk_size: int = CHUNK_SIZE) -> "RelationStatistics":
+    tasks = [(path, start, end) for start, end in chunk_bounds(path, chunk_size)]
+    summary = TableSummary()
+    for chunk_summary in (pool.imap(scan_chunk, tasks) if pool and len(tasks) > 1 else map(scan_chunk, tasks)):
+        summary.merge(chunk_summary)
+    return summary.statistics(name)
+
+
+def _file_key(path: str) -> "dict[str, int]":
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def load_catalog(dataset_dir: str) -> "dict[str, dict]":
+    path = os.path.join(dataset_dir, CATALOG_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            stored = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if stored.get("version") != CATALOG_VERSION:
+        return {}
+    return stored.get("relations", {})
+
+
+def collect_statistics(dataset_dir: str, relation_names: "list[str]", workers: "int|None" = None,
+                       chunk_size: int = CHUNK_SIZE) -> "Catalog":
+    # tables whose size and mtime match the stored catalog are not scanned again
+    stored = load_catalog(dataset_dir)
+    entries = {}
+    todo = []
+    for name in dict.fromkeys(relation_names):
+        path = table_path(dataset_dir, name)
+        if not os.path.exists(path):
+            continue
+        entry = stored.get(name)
+        if entry is not None and entry["file"] == _file_key(path):
+            entries[name] = entry
+        else:
+            todo.append((name, path))
+    if todo:
+        # small tables are a single chunk, the pool only pays off for tables spanning several
+        parallel = workers != 1 and any(os.path.getsize(path) > chunk_size for _, path in todo)
+        with Pool(workers) if parallel else nullcontext() as pool:
+            for name, path in todo:
+                file_key = _file_key(path)
+                stats = scan_table(path, name, pool, chunk_size)
+                entries[name] = {"file": file_key,
+                                 "row_count": stats.row_count,
+                                 "distinct_counts": stats.distinct_counts,
+                                 "heavy_hitters": stats.heavy_hitters}
+        stored.update(entries)
+        tmp_path = os.path.join(dataset_dir, CATALOG_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CATALOG_VERSION, "relations": stored}, f, indent=1)
+        os.replace(tmp_path, os.path.join(dataset_dir, CATALOG_FILE))
+    return Catalog([RelationStatistics(name, entry["row_count"], entry["distinct_counts"], entry["heavy_hitters"])
+                    for name, entry in entries.items()])
+
+
+NPY_DIR = ".npy"
+NPY_VERSION = 1
+
+
+def column_dtype(var_type: str):
+    import numpy as np
+
+    var_type = var_type.lower()
+    if var_type in ("int", "long", "short", "byte"):
+        return np.int64
+    if var_type in ("double", "float", "decimal"):
+        return np.float64
+    if var_type == "date":
+        return np.dtype("datetime64[D]")
+    return None  # kept as bytes
+
+
+def parse_chunk(data: bytes, dtypes: "list") -> "list":
+    import numpy as np
+
+    rows = [line.rstrip(b"\r").split(b"|") for line in data.split(b"\n") if line]
+    res = []
+    for i, dtype in enumerate(dtypes):
+        fields = np.array([row[i] for row in rows], dtype=bytes) if rows else np.array([], dtype="S1")
+        res.append(fields if dtype is None else fields.astype(dtype))
+    return res
+
+
+def _cache_dir(dataset_dir: str, relation_name: str) -> str:
+    return os.path.join(dataset_dir, NPY_DIR, relation_name)
+
+
+def _cached_columns(cache_dir: str, file_key: "dict[str, int]", names: "list[str]") -> "list|None":
+    import numpy as np
+
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if meta.get("version") != NPY_VERSION or meta.get("file") != file_key or meta.get("columns") != names:
+        return None
+    return [np.load(os.path.join(cache_dir, f"{i}.npy"), mmap_mode="r") for i in range(len(names))]
+
+
+def load_table(dataset_dir: str, relation: "M3Relation", chunk_size: int = CHUNK_SIZE) -> "list":
+    # the columns of relation's .tbl file as typed numpy arrays, in config order. Parsed columns are kept as .npy
+    # files next to the dataset and memory-mapped while the table's size and mtime are unchanged. Numeric and
+    # date columns are written chunk by chunk, so a table larger than memory only needs its text columns in it
+    import numpy as np
+
+    path = table_path(dataset_dir, relation.name)
+    names = [var.name for var in relation.columns]
+    dtypes = [column_dtype(var.var_type) for var in relation.columns]
+    file_key = _file_key(path)
+    cache_dir = _cache_dir(dataset_dir, relation.name)
+    cached = _cached_columns(cache_dir, file_key, names)
+    if cached is not None:
+        return cached
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_paths = [os.path.join(cache_dir, f"{i}.npy.tmp") for i in range(len(names))]
+    bounds = chunk_bounds(path, chunk_size)
+    if not bounds:
+        for tmp_path, dtype in zip(tmp_paths, dtypes):
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.array([], dtype=dtype if dtype is not None else "S1"))
+    else:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            row_counts = [sum(1 for line in data[start:end].split(b"\n") if line) for start, end in bounds]
+            outputs = [np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(sum(row_counts),))
+                       if dtype is not None else [] for tmp_path, dtype in zip(tmp_paths, dtypes)]
+            offset = 0
+            for (start, end), nr_chunk_rows in zip(bounds, row_counts):
+                for output, column in zip(outputs, parse_chunk(data[start:end], dtypes)):
+                    if isinstance(output, list):
+                        output.append(column)
+                    else:
+                        output[offset:offset + nr_chunk_rows] = column
+                offset += nr_chunk_rows
+        for tmp_path, output in zip(tmp_paths, outputs):
+            if isinstance(output, list):
+                with open(tmp_path, "wb") as f:
+                    np.save(f, np.concatenate(output))
+            else:
+                output.flush()
+        del outputs
+    for i, tmp_path in enumerate(tmp_paths):
+        os.replace(tmp_path, os.path.join(cache_dir, f"{i}.npy"))
+    with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+        json.dump({"version": NPY_VERSION, "file": file_key, "columns": names}, f)
+    return [np.load(os.path.join(cache_dir, f"{i}.npy"), mmap_mode="r") for i in range(len(names))]
+
+
+def load_dataset(generator: "M3Generator", dataset_dir: "str|None" = None, chunk_size: int = CHUNK_SIZE) -> "dict[str, list]":
+    # relation name to columns, as executor.execute and DeltaSimulator take them
+    dataset_dir = dataset_dir if dataset_dir else os.path.join(".", "datasets", generator.dataset)
+    return {relation.name: load_table(dataset_dir, relation, chunk_size) for relation in generator.relations
+            if os.path.exists(table_path(dataset_dir, relation.name))}
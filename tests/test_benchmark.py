@@ -0,0 +1,28 @@
+import io
+import os
+
+from JoinOrderNode import JoinOrderNode
+from M3Generator import M3Generator
+from Query import Query
+from Relation import Relation
+from benchmark import run_benchmark, write_m3_config
+
+
+def test_config_covers_differently_named_occurrences(tmp_path):
+    q1 = Query("Q1", {Relation("R1", ["x", "y"]), Relation("R2", ["y", "z"])}, {"y", "z"})
+    q2 = Query("Q2", {Relation("R1", ["a", "s"]), Relation("R2", ["s", "d"]), Relation("R3", ["d", "w"])}, {"s", "d", "w"})
+    config = str(tmp_path / "config.txt")
+    write_m3_config(config, [q1, q2])
+    generator = M3Generator(config, "test", "RingFactorizedRelation")
+    assert len(generator.relations) == 3
+    for query in (q1, q2):
+        out = io.StringIO()
+        generator.generate(JoinOrderNode.generate(query.variable_order, query), out)
+        assert "DECLARE MAP" in out.getvalue()
+
+
+def test_benchmark_leaves_the_working_directory_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows = run_benchmark([3], [2], [2], seeds=range(2), _print=False)
+    assert {row["stage"] for row in rows} >= {"cascade_run", "m3_generate"}
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,119 @@
+import itertools
+import random
+
+import pytest
+
+import cascade
+from Catalog import Catalog, RelationStatistics
+from Helpers import exact_cover_reductions
+from Query import Query, QuerySet
+from QueryGenerator import generate
+from Relation import Relation
+from cost import maintenance_cost
+
+CONFIGS = [(3, 3, 2, 5, 2, 4, 1, 7, 3), (6, 3, 1, 7, 2, 3, 1, 8, 3), (10, 3, 1, 9, 2, 3, 1, 9, 3)]
+
+
+def workload(config, seed):
+    # generate() also draws from the global random state
+    random.seed(seed)
+    return generate(*config, seed=seed)
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_semi_naive_matches_full_evaluation(config):
+    found = 0
+    for seed in range(23445, 23445 + 60):
+        semi_naive = cascade.run(workload(config, seed), semi_naive=True)
+        full = cascade.run(workload(config, seed), semi_naive=False)
+        assert repr(semi_naive) == repr(full)
+        found += semi_naive is not None
+    assert found
+
+
+def random_catalog(queries, seed):
+    rnd = random.Random(seed)
+    relations = {rel.name: rel for query in queries for rel in query.relations}
+    stats = []
+    for name, rel in relations.items():
+        row_count = rnd.choice([10, 1000, 10 ** 5])
+        stats.append(RelationStatistics(name, row_count, [rnd.randint(1, row_count) for _ in rel.free_variables]))
+    return Catalog(stats)
+
+
+@pytest.mark.parametrize("with_catalog", [False, True])
+@pytest.mark.parametrize("config", CONFIGS)
+def test_cheapest_is_the_first_minimal_candidate(config, with_catalog, monkeypatch):
+    searches = []
+
+    def recording(options, size):
+        searches.append((list(options), size))
+        return exact_cover_reductions(options, size)
+
+    monkeypatch.setattr(cascade, "exact_cover_reductions", recording)
+    max_candidates = 8
+    checked = 0
+    for seed in range(23445, 23445 + 200):
+        queries = workload(config, seed)
+        catalog = random_catalog(queries, seed) if with_catalog else None
+        searches.clear()
+        res = cascade.run(queries, reduction_search="cheapest", catalog=catalog, max_candidates=max_candidates)
+        if res is None:
+            continue
+        options, size = searches[-1]
+        candidates = list(itertools.islice(exact_cover_reductions(options, size), max_candidates))
+        costs = [maintenance_cost(QuerySet(x), catalog)["cost"] for x in candidates]
+        cheapest = min(costs)
+        # costs of different reductions can be this close on large tables, only summation order is tolerated
+        first = next(i for i, cost in enumerate(costs) if cost == pytest.approx(cheapest, rel=1e-12))
+        assert res.queries == candidates[first]
+        assert res.cost is not None and res.cost["cost"] == pytest.approx(cheapest, rel=1e-12)
+        checked += len(candidates) > 1
+    assert checked
+
+
+def test_cheapest_keeps_the_first_of_tied_candidates():
+    # every rewriting is a single relation over one variable, all reductions cost the same
+    options = [Query(f"Q{k}", {Relation(f"R{k}_{j}", ["a"])}, {"a"}) for k in range(3) for j in range(2)]
+    candidates = list(exact_cover_reductions(options, 3))
+    assert len(candidates) == 8
+    assert len({maintenance_cost(QuerySet(x))["cost"] for x in candidates}) == 1
+    res = cascade.choose_reduction(options, 3, "cheapest")
+    assert res.queries == candidates[0]
+    assert res.cost == maintenance_cost(QuerySet(candidates[0]))
+
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_workers_match_the_serial_run(config, monkeypatch):
+    # the round the pool evaluated each pair in, a pair the pairs loop only checks in a later round was left behind
+    # by an early break
+    prefetched_in = {}
+    rounds = []
+    deferred = []
+    prefetch_homomorphisms = cascade.prefetch_homomorphisms
+    is_homomorphism = cascade.is_homomorphism
+
+    def recording_prefetch(pool, workers, pairs):
+        rounds.append(pairs)
+        for pair in pairs:
+            prefetched_in[pair] = len(rounds)
+        return prefetch_homomorphisms(pool, workers, pairs)
+
+    def recording_check(q_query, nq_query):
+        if prefetched_in.get((q_query, nq_query), len(rounds)) < len(rounds):
+            deferred.append((q_query, nq_query))
+        return is_homomorphism(q_query, nq_query)
+
+    monkeypatch.setattr(cascade, "prefetch_homomorphisms", recording_prefetch)
+    monkeypatch.setattr(cascade, "is_homomorphism", recording_check)
+    found = 0
+    for seed in range(23445, 23445 + 30):
+        prefetched_in.clear()
+        rounds.clear()
+        serial = cascade.run(workload(config, seed))
+        parallel = cascade.run(workload(config, seed), workers=2)
+        assert repr(parallel) == repr(serial)
+        found += serial is not None
+    assert found
+    assert deferred
@@ -0,0 +1,35 @@
+import pytest
+
+from Catalog import Catalog, RelationStatistics
+from JoinOrderNode import JoinOrderNode
+from Query import Query, QuerySet
+from Relation import Relation
+from VariableOrder import VariableOrderNode
+from cost import maintenance_cost
+
+
+def tree_cost(root: "JoinOrderNode", catalog: "Catalog"):
+    nodes = {}
+
+    def collect(node):
+        nodes[id(node)] = node
+        for child in node.children:
+            collect(child)
+
+    collect(root)
+    return sum(catalog.view_size(node.all_relations(), node.free_variables) *
+               sum(catalog.row_count(rel) for rel in node.all_relations(source_only=True)) for node in nodes.values())
+
+
+def test_catalog_costs_the_catalog_driven_tree():
+    relations = {Relation("R", ["a", "b"]), Relation("S", ["b", "c"]), Relation("T", ["c", "d"]), Relation("U", ["b"])}
+    catalog = Catalog([RelationStatistics("R", 10, [10, 10]), RelationStatistics("S", 10, [10, 10]), RelationStatistics("U", 10, [10]),
+                       RelationStatistics("T", 10 ** 6, [10 ** 6, 10 ** 6])])
+    query = Query("Q", relations, set())
+    default_order = query.variable_order
+    default_cost = tree_cost(JoinOrderNode.generate(default_order, query), catalog)
+    catalog_cost = tree_cost(JoinOrderNode.generate(VariableOrderNode.generate(relations, set(), catalog), query), catalog)
+    assert catalog_cost != pytest.approx(default_cost)
+    assert maintenance_cost(QuerySet({query}), catalog)["cost"] == pytest.approx(catalog_cost)
+    # the order the query keeps for M3 generation is not replaced
+    assert query.variable_order is default_order
@@ -0,0 +1,61 @@
+import itertools
+import random
+
+import pytest
+
+import executor
+from JoinOrderNode import JoinOrderNode
+from Query import Query
+from Relation import Relation
+
+
+def random_query(rnd: "random.Random") -> "Query":
+    # variables may repeat inside a relation. Only the variable orders of q-hierarchical queries keep every
+    # variable above all relations containing it, the trees of the others do not compute their joins
+    variables = list("abcd")
+    while True:
+        relations = {Relation(f"R{i}", [rnd.choice(variables) for _ in range(rnd.randint(1, 3))])
+                     for i in range(rnd.randint(1, 3))}
+        used = sorted({var for rel in relations for var in rel.free_variables})
+        query = Query("Q", relations, set(rnd.sample(used, rnd.randint(0, len(used)))))
+        if query.is_q_hierarchical():
+            return query
+
+
+def random_rows(query: "Query", rnd: "random.Random") -> "dict[str, list[tuple]]":
+    # a small domain, so rows repeat and the relations are bags
+    return {rel.name: [tuple(rnd.randint(0, 2) for _ in rel.free_variables) for _ in range(rnd.randint(0, 6))]
+            for rel in query.relations}
+
+
+def nested_loops(relations: "set[Relation]", rows: "dict[str, list[tuple]]", variables: "tuple[str, ...]") -> "dict[tuple, int]":
+    relations = sorted(relations, key=lambda x: x.name)
+    res: "dict[tuple, int]" = {}
+    for combination in itertools.product(*(rows[rel.name] for rel in relations)):
+        binding = {}
+        if all(binding.setdefault(var, value) == value
+               for rel, row in zip(relations, combination) for var, value in zip(rel.free_variables, row)):
+            key = tuple(binding[var] for var in variables)
+            res[key] = res.get(key, 0) + 1
+    return res
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_execute_matches_nested_loops(seed):
+    rnd = random.Random(seed)
+    query = random_query(rnd)
+    rows = random_rows(query, rnd)
+    data = {rel.name: list(zip(*rows[rel.name])) if rows[rel.name] else [[] for _ in rel.free_variables]
+            for rel in query.relations}
+    root = JoinOrderNode.generate(query.variable_order, query)
+    view, report = executor.execute(root, data)
+    assert report[-1]["size"] == len(view)
+    # every node is its subtree's relations joined and summed onto the node's free variables
+    nodes = [root]
+    for node in nodes:
+        nodes.extend(node.children)
+        relations = node.all_relations()
+        variables = tuple(sorted(set(node.free_variables).intersection(var for rel in relations for var in rel.free_variables)))
+        node_view = executor.execute(node, data)[0]
+        assert node_view.variables == variables
+        assert node_view.tuples == nested_loops(relations, rows, variables)
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from Query import Query
+from Relation import Relation
+from hierarchy import is_q_hierarchical_laminar, q_hierarchical_batch, q_hierarchy_witness
+
+
+def random_queries(seed: int, count: int) -> "list[Query]":
+    rnd = random.Random(seed)
+    res = []
+    for i in range(count):
+        variables = [chr(97 + j) for j in range(rnd.randint(1, 8))]
+        relations = {Relation(f"R{r}", [rnd.choice(variables) for _ in range(rnd.randint(1, 4))])
+                     for r in range(rnd.randint(1, 6))}
+        # z is free without occurring in any relation
+        free_variables = set(rnd.sample(variables + ["z"], rnd.randint(0, len(variables))))
+        res.append(Query(f"Q{i}", relations, free_variables))
+    return res
+
+
+def pairwise(query: "Query") -> bool:
+    return Query(query.name, query.relations, set(query.free_variables)).is_q_hierarchical()
+
+
+def violates(query: "Query", a: str, b: str) -> bool:
+    atoms = {var: {rel for rel in query.atoms if var in rel.free_variables} for var in (a, b)}
+    a_free = a in query.free_variables
+    b_free = b in query.free_variables
+    b_in_a = atoms[b] <= atoms[a]
+    a_in_b = atoms[a] <= atoms[b]
+    return (a_in_b and a_free and not b_free) or (b_in_a and b_free and not a_free) or \
+        not (b_in_a or a_in_b or atoms[a].isdisjoint(atoms[b]))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_batch_matches_pairwise_definition(seed):
+    queries = random_queries(seed, 2000)
+    expected = [pairwise(query) for query in queries]
+    assert any(expected) and not all(expected)
+    assert q_hierarchical_batch(queries, chunk_size=300) == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_laminar_check_matches_pairwise_definition(seed):
+    for query in random_queries(seed, 2000):
+        expected = pairwise(query)
+        witness = q_hierarchy_witness(query)
+        assert (witness is None) == expected
+        if witness is not None:
+            assert violates(query, *witness)
+        assert is_q_hierarchical_laminar(query) == expected
+
+
+def test_deep_chain():
+    relations = {Relation(f"R{i}", [f"v{j}" for j in range(i + 1)]) for i in range(60)}
+    query = Query("Q", relations, {f"v{j}" for j in range(60)})
+    assert q_hierarchy_witness(query) is None
+    assert q_hierarchical_batch([query]) == [pairwise(query)] == [True]
+    # a bound variable above a free one
+    query = Query("Q", relations, {f"v{j}" for j in range(1, 60)})
+    witness = q_hierarchy_witness(query)
+    assert witness is not None and violates(query, *witness)
+    assert q_hierarchical_batch([query]) == [pairwise(query)] == [False]
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from Helpers import _MISSING, HomomorphismCache, homomorphism_mapping, is_homomorphism
+from Query import Query
+from QueryGenerator import generate
+from Relation import Relation
+
+
+def detached(query):
+    # is_homomorphism adds the join variables to the free variables of the query it rewrites
+    return Query(query.name, query.relations, set(query.free_variables))
+
+
+def chain_query():
+    return Query("Q", {Relation("R", ["a", "b"])}, {"a"})
+
+
+def star_query():
+    return Query("P", {Relation("R", ["x", "y"]), Relation("T", ["x"])}, {"x"})
+
+
+def test_repeated_structure_hits_the_cache():
+    cache = HomomorphismCache()
+    first = is_homomorphism(chain_query(), star_query(), cache)
+    assert cache.stats() == {"hits": 0, "misses": 1, "size": 1, "maxsize": cache.maxsize}
+    # other variable names, same structure
+    renamed = Query("Q", {Relation("R", ["c", "d"])}, {"c"})
+    second = is_homomorphism(renamed, star_query(), cache)
+    assert cache.stats()["hits"] == 1 and cache.stats()["size"] == 1
+    assert str(first) == str(second) == "P(x) = T(x)*V_Q(x)"
+    # a different structure misses
+    assert is_homomorphism(Query("Q", {Relation("R", ["a", "b"])}, {"b"}), star_query(), cache) is None
+    assert cache.stats()["misses"] == 2 and cache.stats()["size"] == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = HomomorphismCache(maxsize=2)
+    cache.put(("a",), None)
+    cache.put(("b",), {0: 0})
+    assert cache.get(("a",)) is None
+    cache.put(("c",), {1: 1})
+    assert cache.stats()["size"] == 2
+    assert cache.get(("b",)) is _MISSING
+    assert cache.get(("a",)) is None and cache.get(("c",)) == {1: 1}
+
+
+@pytest.mark.parametrize("q_query, nq_query", [
+    # self join
+    (Query("Q", {Relation("R", ["a", "b"]), Relation("R", ["b", "c"])}, {"a"}),
+     Query("P", {Relation("R", ["x", "y"]), Relation("R", ["y", "z"]), Relation("T", ["x"])}, {"x"})),
+    # repeated variable
+    (Query("Q", {Relation("R", ["a", "a"])}, {"a"}), Query("P", {Relation("R", ["x", "x"]), Relation("T", ["x"])}, {"x"})),
+])
+def test_self_joins_and_repeated_variables_are_not_cached(q_query, nq_query):
+    cache = HomomorphismCache()
+    expected = is_homomorphism(q_query, detached(nq_query), None)
+    assert str(is_homomorphism(q_query, nq_query, cache)) == str(expected)
+    assert cache.stats() == {"hits": 0, "misses": 0, "size": 0, "maxsize": cache.maxsize}
+
+
+def test_changed_free_variables_of_the_same_size_are_not_served_stale():
+    cache = HomomorphismCache()
+    query = chain_query()
+    assert is_homomorphism(query, star_query(), cache) is not None
+    query.free_variables.clear()
+    query.free_variables.add("b")
+    assert homomorphism_mapping(query, star_query()) is None
+    assert is_homomorphism(query, star_query(), cache) is None
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_cached_results_match_the_uncached_mapping(seed):
+    random.seed(seed)
+    queries = generate(6, 3, 1, 7, 2, 3, 1, 8, 3, seed=seed)
+    cache = HomomorphismCache()
+    compared = 0
+    for _ in range(2):  # the second pass is served from the cache where it can be
+        for q_query in queries:
+            for nq_query in queries:
+                if q_query is nq_query:
+                    continue
+                mapping = homomorphism_mapping(q_query, detached(nq_query))
+                uncached_nq = detached(nq_query)
+                expected = is_homomorphism(q_query, uncached_nq, None)
+                cached_nq = detached(nq_query)
+                res = is_homomorphism(q_query, cached_nq, cache)
+                assert (res is not None) == (mapping is not None) == (expected is not None)
+                assert str(res) == str(expected)
+                assert cached_nq.free_variables == uncached_nq.free_variables
+                compared += 1
+    # the second pass finds every structure the first one stored
+    assert compared and cache.hits >= cache.stats()["size"]
@@ -0,0 +1,28 @@
+import io
+import os
+
+import pytest
+
+from JoinOrderNode import JoinOrderNode
+from M3Generator import M3Generator
+from benchmark import workload, write_m3_config
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_buffer_path_and_string_output_agree(seed, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    queries = workload(3, 3, 3, seed)
+    write_m3_config("config.txt", queries)
+    # every generator hands out view indices from its own counter, so each output gets a fresh one
+    generators = [M3Generator("config.txt", "test", "RingFactorizedRelation") for _ in range(3)]
+    for query in queries:
+        # children sets iterate in id order, so all outputs are written from the same tree
+        join_tree = JoinOrderNode.generate(query.variable_order, query)
+        buffer = io.StringIO()
+        generators[0].generate(join_tree, buffer)
+        path = tmp_path / f"{query.name}.m3"
+        generators[1].generate(join_tree, str(path))
+        string = generators[2].generate_string(join_tree)
+        assert buffer.getvalue() == path.read_text() == string
+        assert "TRIGGERS" in string
+    assert not os.path.exists("output.m3")
@@ -0,0 +1,45 @@
+import io
+import re
+
+import pytest
+
+import cascade
+from M3Generator import M3Generator
+from benchmark import workload, write_m3_config
+
+
+def query_set_program(query_set, tmp_path, share_views=True):
+    config = str(tmp_path / "config.txt")
+    write_m3_config(config, list(query_set.queries))
+    out = io.StringIO()
+    M3Generator(config, "test", "RingFactorizedRelation").generate_query_set(query_set, out, share_views)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("seed", [12, 25, 34, 40])
+def test_every_query_is_declared(seed, tmp_path):
+    query_set = cascade.run(workload(3, 3, 3, seed))
+    assert query_set is not None
+    text = query_set_program(query_set, tmp_path)
+    maps = set(re.findall(r"DECLARE MAP (\w+)\(", text))
+    declared = dict(re.findall(r"DECLARE QUERY (\w+) := (\w+)\(", text))
+    for query, root in query_set.join_orders():
+        name = f"{query.name}_{root.designation}_{root.child_rel_names}"
+        assert declared[name] in maps
+
+
+def trigger_targets(text: str, operator: str) -> "dict[str, set[str]]":
+    res = {}
+    for rel, body in re.findall(rf"ON {re.escape(operator)} (\w+)\(.*?\{{(.*?)\}}", text, re.S):
+        res[rel] = set(re.findall(r"^\s*(\w+)\(.*?\+=", body, re.M))
+    return res
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_deletes_update_the_same_maps_as_inserts(seed, tmp_path):
+    query_set = cascade.run(workload(6, 3, 3, seed))
+    if query_set is None:
+        return
+    text = query_set_program(query_set, tmp_path)
+    assert "__view_delta__" not in text
+    assert trigger_targets(text, "-") == trigger_targets(text, "+")
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from Helpers import exact_cover_reduction, exact_cover_reductions, find_compatible_reductions, \
+    first_compatible_reduction
+from Query import Query
+from Relation import Relation
+
+
+def options(nr_names: int, nr_variants: int, dependency_chance: float, seed: int) -> "list[Query]":
+    # nr_variants rewritings per query name, each depending on an earlier rewriting of another name and its
+    # dependencies
+    rnd = random.Random(seed)
+    variants = [Query(f"Q{k}", {Relation(f"R{k}_{j}", ["a"])}, {"a"}) for k in range(nr_names) for j in range(nr_variants)]
+    created = []
+    for query in rnd.sample(variants, len(variants)):
+        if created and rnd.random() < dependency_chance:
+            dependency = rnd.choice(created)
+            if dependency.name != query.name:
+                query.dependant_on.add(dependency)
+                query.dependant_on.update(dependency.dependant_on)
+        created.append(query)
+    return rnd.sample(variants, len(variants))
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_exact_cover_enumerates_the_compatible_reductions(seed):
+    rnd = random.Random(seed)
+    nr_names = rnd.randint(1, 4)
+    opts = options(nr_names, rnd.randint(1, 3), 0.4, seed)
+    enumerated = [x for x in find_compatible_reductions(opts) if len(x) == nr_names]
+    assert list(exact_cover_reductions(opts, nr_names)) == enumerated
+    first = enumerated[0] if enumerated else None
+    assert exact_cover_reduction(opts, nr_names) == first
+    assert first_compatible_reduction(opts, nr_names) == first
+
+
+def test_exact_cover_without_a_complete_reduction():
+    opts = options(3, 2, 0.0, 0)
+    missing = [x for x in opts if x.name != "Q2"]
+    assert exact_cover_reduction(missing, 3) is None
+    assert list(exact_cover_reductions(missing, 3)) == []
@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+
+from Query import Query
+from Relation import Relation
+from benchmark import workload
+from result_cache import ResultCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEEDS = range(40)
+
+RUN = """
+import json, sys
+import cascade
+from benchmark import workload
+from result_cache import ResultCache
+
+if sys.argv[1] == "fresh":
+    results = [repr(cascade.run(workload(6, 3, 3, seed))) for seed in range({seeds})]
+    print(json.dumps({{"results": results}}))
+else:
+    cache = ResultCache(sys.argv[1])
+    results = [repr(cache.run(workload(6, 3, 3, seed))) for seed in range({seeds})]
+    print(json.dumps({{"results": results, "stats": cache.stats()}}))
+"""
+
+
+def run_process(argument: str) -> "dict":
+    # the same hash seed in every process, the search itself depends on set iteration order
+    env = dict(os.environ, PYTHONHASHSEED="0")
+    out = subprocess.run([sys.executable, "-c", RUN.format(seeds=len(SEEDS)), argument], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+def test_hit_matches_fresh_run_across_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    fresh = run_process("fresh")
+    cold = run_process(path)
+    warm = run_process(path)
+    assert cold["stats"]["hits"] == 0
+    assert warm["stats"]["misses"] == 0 and warm["stats"]["hits"] == len(SEEDS)
+    assert cold["results"] == fresh["results"]
+    assert warm["results"] == fresh["results"]
+
+
+def renamed(queries: "list[Query]") -> "list[Query]":
+    res = []
+    for query in reversed(queries):
+        names = {var: f"x{var}" for rel in query.relations for var in rel.free_variables}
+        res.append(Query(f"Renamed{query.name}", {Relation(rel.name, [names[var] for var in rel.free_variables]) for rel in query.relations},
+                         {names[var] for var in query.free_variables}))
+    return res
+
+
+def test_renamed_workload_hits(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    for seed in SEEDS:
+        cache.run(workload(6, 3, 3, seed))
+    hits = cache.hits
+    for seed in SEEDS:
+        res = cache.run(renamed(workload(6, 3, 3, seed)))
+        if res is not None:
+            assert all(query.name.startswith("Renamed") for query in res.queries)
+            assert all(var.startswith("x") for query in res.queries for var in query.free_variables)
+    assert cache.hits == hits + len(SEEDS)
+
+
+def test_input_queries_are_not_changed(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    for _ in range(2):
+        for seed in SEEDS:
+            queries = workload(6, 3, 3, seed)
+            before = [set(query.free_variables) for query in queries]
+            cache.run(queries)
+            assert [query.free_variables for query in queries] == before
+
+
+def test_other_versions_are_dropped(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResultCache(path, version="a")
+    cache.run(workload(6, 3, 3, 0))
+    cache.close()
+    assert ResultCache(path, version="a").stats()["size"] == 1
+    assert ResultCache(path, version="b").stats()["size"] == 0
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+import cascade
+from RunStats import RunStats
+from test_cascade import CONFIGS, workload
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("config", CONFIGS)
+def test_every_pair_considered_is_accounted_for(config, workers):
+    totals = RunStats()
+    for seed in range(23445, 23445 + 20):
+        stats = RunStats()
+        cascade.run(workload(config, seed), workers=workers, stats=stats)
+        counters = stats.counters
+        skipped = sum(count for name, count in counters.items() if name.startswith("skipped_") and
+                      name not in ("skipped_relation_names", "skipped_semi_naive"))
+        # pairs the relation name index or semi-naive evaluation left out are never considered
+        assert counters.get("pairs_considered", 0) == \
+            skipped + counters.get("rejected_by_prefetch", 0) + counters.get("homomorphism_checks", 0)
+        if workers == 1:
+            assert "rejected_by_prefetch" not in counters and "prefetched" not in counters
+        assert counters.get("homomorphisms_found", 0) <= counters.get("homomorphism_checks", 0)
+        assert counters["input_queries"] == len(workload(config, seed))
+        for name, count in counters.items():
+            totals.count(name, count)
+    assert totals.counters["pairs_considered"] > totals.counters["homomorphism_checks"] > 0
+
+
+def test_as_dict_and_chrome_trace(tmp_path):
+    stats = RunStats()
+    cascade.run(workload(CONFIGS[1], 23446), workers=2, stats=stats)
+    as_dict = stats.as_dict()
+    assert json.loads(json.dumps(as_dict)) == as_dict
+    assert as_dict["counters"] == stats.counters and as_dict["phase_times"] == stats.phase_times
+
+    path = tmp_path / "trace.json"
+    stats.write_chrome_trace(str(path))
+    trace = json.loads(path.read_text())
+    events = trace["traceEvents"]
+    assert trace["otherData"] == as_dict
+    assert {"classify", "candidates", "prefetch", "pairs"} <= {event["name"] for event in events}
+    for event in events:
+        assert event["ph"] == "X" and event["dur"] >= 0 and event["ts"] >= 0
+    assert len([x for x in events if x["name"] == "classify"]) == 1
+    for name in ("candidates", "prefetch", "pairs"):
+        # one complete event per round, numbered from 1
+        assert sorted(x["args"]["round"] for x in events if x["name"] == name) == \
+            list(range(1, stats.counters["rounds"] + 1))
+    # the phase times are the summed durations of the events
+    for name, seconds in stats.phase_times.items():
+        if name != "is_homomorphism":
+            assert sum(x["dur"] for x in events if x["name"] == name) == pytest.approx(seconds * 1e6)
+    # events of one thread do not overlap
+    spans = sorted((x["ts"], x["ts"] + x["dur"]) for x in events)
+    assert all(end <= next_start + 1e-3 for (_, end), (next_start, _) in zip(spans, spans[1:]))
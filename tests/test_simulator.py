@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+import cascade
+import executor
+from Query import QuerySet
+from benchmark import workload
+from simulator import DeltaSimulator
+
+
+def batches(relations: "dict", rnd: "random.Random", count: int = 30):
+    # random inserts and deletes of earlier inserted rows, and the rows left at the end
+    rows = {name: [tuple(rnd.randint(0, 3) for _ in rel.free_variables) for _ in range(10)] for name, rel in relations.items()}
+    live = {name: [] for name in relations}
+    res = []
+    for _ in range(count):
+        name = rnd.choice(sorted(relations))
+        if live[name] and rnd.random() < 0.3:
+            batch = rnd.sample(live[name], min(len(live[name]), rnd.randint(1, 3)))
+            for row in batch:
+                live[name].remove(row)
+            res.append(("-", name, batch))
+        else:
+            batch = [rnd.choice(rows[name]) for _ in range(rnd.randint(1, 4))]
+            live[name].extend(batch)
+            res.append(("+", name, batch))
+    return res, live
+
+
+@pytest.mark.parametrize("share_views", [False, True])
+@pytest.mark.parametrize("seed", range(20))
+def test_simulator_matches_executor_after_inserts_and_deletes(seed, share_views):
+    queries = workload(4, 3, 3, seed)
+    relations = {rel.name: rel for query in queries for rel in query.relations}
+    updates, live = batches(relations, random.Random(seed))
+    data = {name: list(zip(*live[name])) if live[name] else [[] for _ in relations[name].free_variables]
+            for name in relations}
+    query_set = cascade.run(workload(4, 3, 3, seed))
+    simulator = DeltaSimulator.for_query_set(query_set if query_set else QuerySet(set(queries)), share_views)
+    report = simulator.run(updates)
+    assert report["maintained_views"] > 0
+    for root in simulator.roots:
+        assert simulator.view(root).tuples == executor.execute(root, data)[0].tuples
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rebuilt_view_relations_are_left_out_of_the_peaks(seed):
+    queries = workload(4, 3, 3, seed)
+    relations = {rel.name: rel for query in queries for rel in query.relations}
+    updates = [x for x in batches(relations, random.Random(seed))[0] if x[0] == "+"]
+    query_set = cascade.run(workload(4, 3, 3, seed))
+    simulator = DeltaSimulator.for_query_set(query_set if query_set else QuerySet(set(queries)))
+    report = simulator.run(updates)
+    states = [state for node_states in simulator.relations.values() for state in node_states]
+    rebuilt = [state for state in states if state.sources]
+    assert report["rebuilt_view_relations"] == len(rebuilt)
+    assert report["rebuilt_view_relations"] == sum(1 for node in simulator.nodes.values() for rel in node.relations if rel.sources)
+    # inserts only add keys, the peaks are the sizes at the end
+    assert report["peak_view_keys"] == sum(map(len, simulator.views.values())) + \
+        sum(len(state.view) for state in states if not state.sources)
+    assert report["peak_rebuilt_view_keys"] == sum(len(view) for state in rebuilt for view in state.views())
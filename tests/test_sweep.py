@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+from QueryGenerator import generate
+from cascade import run
+from sweep import GENERATOR_ARGS, sweep
+
+
+def serial_loop(nr_attempts: int, seed_base: int):
+    # the loop example_6 ran before the sweep runner
+    nr_valid = 0
+    successes = []
+    random.seed(seed_base)
+    for attempt in range(nr_attempts):
+        queries = generate(**GENERATOR_ARGS, seed=seed_base + attempt)
+        q_hierarchical = map(lambda x: x.is_q_hierarchical(), queries)
+        not_q_hierarchical = map(lambda x: not x, q_hierarchical)
+        if any(q_hierarchical) and any(not_q_hierarchical):
+            nr_valid += 1
+            if run(queries) is not None:
+                successes.append(seed_base + attempt)
+    return nr_valid, successes
+
+
+def test_sweep_reproduces_the_serial_loop(tmp_path):
+    seeds = list(range(23445, 23445 + 80))
+    nr_valid, successes = serial_loop(len(seeds), seeds[0])
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    summary, results = sweep(seeds, checkpoint, workers=2, _print=False, rng_seed=seeds[0])
+    assert summary["nr_valid"] == nr_valid
+    assert [entry["seed"] for entry in results if entry["success"]] == successes
+    resumed, _ = sweep(seeds, checkpoint, workers=2, _print=False, rng_seed=seeds[0])
+    assert (resumed["nr_attempts"], resumed["nr_valid"], resumed["nr_run_success"]) == (len(seeds), nr_valid, len(successes))
+
+
+def test_repeated_seeds_are_counted_every_time(tmp_path, capsys):
+    seeds = [23445, 23446, 23445, 23447, 23446]
+    summary, results = sweep(seeds, str(tmp_path / "checkpoint.jsonl"), workers=2, _print=False)
+    assert summary["nr_attempts"] == len(seeds)
+    assert [entry["seed"] for entry in results] == seeds
+    assert capsys.readouterr().out == ""
+    with pytest.raises(ValueError):
+        sweep(seeds, str(tmp_path / "other.jsonl"), workers=2, _print=False, rng_seed=23445)
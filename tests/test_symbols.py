@@ -0,0 +1,79 @@
+import pickle
+
+import symbols
+import cascade
+from Query import Query, QuerySet, query_name_mask
+from Relation import Relation
+from benchmark import workload
+
+
+def test_query_ids_do_not_grow_across_runs():
+    def ids_of_run(seed):
+        cascade.run(workload(6, 3, 3, seed), reduction_search="first")
+        return len(symbols.query_bits), max(map(query_name_mask, ["Q0", "Q1", "Q2"]))
+
+    first = ids_of_run(2)
+    assert first[0] > 0
+    for seed in range(100):
+        cascade.run(workload(6, 3, 3, seed), reduction_search="first")
+    assert ids_of_run(2) == first
+
+
+def test_reset_forgets_all_ids():
+    workload(6, 3, 3, 0)
+    symbols.reset()
+    assert len(symbols.relations) == 0 and len(symbols.queries) == 0
+    assert cascade.run(workload(6, 3, 3, 1)) == cascade.run(workload(6, 3, 3, 1))
+
+
+def test_comparing_with_other_types():
+    query = Query("Q", {Relation("R", ["a"])}, {"a"})
+    assert query != "Q" and query != None
+    assert QuerySet({query}) != query
+
+
+def test_objects_from_before_a_reset_keep_comparing_by_structure():
+    old_relation = Relation("R", ["a", "b"])
+    old_query = Query("Q", {old_relation, Relation("S", ["b"])}, {"a"})
+    old_set = QuerySet({old_query})
+    symbols.reset()
+    # the first ids of the new generation, the old objects were handed out the same ones
+    other_relation = Relation("T", ["c"])
+    other_query = Query("P", {other_relation}, {"c"})
+    assert old_relation != other_relation and old_query != other_query and old_set != QuerySet({other_query})
+    new_query = Query("Q", {Relation("S", ["b"]), Relation("R", ["a", "b"])}, {"a"})
+    assert old_relation == Relation("R", ["a", "b"]) and hash(old_relation) == hash(Relation("R", ["a", "b"]))
+    assert old_query == new_query and hash(old_query) == hash(new_query)
+    assert old_set == QuerySet({new_query}) and {old_set: 1}[QuerySet({new_query})] == 1
+    assert new_query in {old_query} and other_query not in {old_query}
+
+
+def test_full_tables_start_a_new_generation(monkeypatch):
+    monkeypatch.setattr(symbols.relations, "maxsize", 8)
+    generation = symbols.relations.generation
+    relations = [Relation(f"R{i}", ["a"]) for i in range(20)]
+    assert len(symbols.relations) <= 8 and symbols.relations.generation > generation
+    assert [x for x in relations if x == Relation("R3", ["a"])] == [relations[3]]
+    assert len(set(relations + [Relation(f"R{i}", ["a"]) for i in range(20)])) == 20
+
+
+def test_cached_masks_follow_a_reset():
+    query = Query("Q", {Relation("R", ["a"]), Relation("S", ["a"])}, {"a"})
+    assert cascade.comparable(query, Query("P", {Relation("R", ["a"]), Relation("S", ["a"]), Relation("T", ["a"])}, {"a"}), set())
+    symbols.reset()
+    # T and U get the bits R and S had
+    other = Query("O", {Relation("T", ["a"]), Relation("U", ["a"])}, {"a"})
+    assert other.relation_name_mask == 0b11
+    assert not cascade.comparable(query, other, set())
+
+
+def test_pickled_queries_are_interned_again():
+    query = Query("Q", {Relation("R", ["a", "b"]), Relation("V_P", ["b"], [Relation("S", ["b", "c"])])}, {"a"})
+    query.dependant_on.add(Query("P", {Relation("S", ["b", "c"])}, {"b"}))
+    data = pickle.dumps(query)
+    symbols.reset()
+    Relation("T", ["c"])
+    loaded = pickle.loads(data)
+    assert loaded == query and str(loaded) == str(query)
+    assert loaded.dependant_on == query.dependant_on
+    assert {x.name for x in loaded.relations} == {"R", "V_P"} and Relation("T", ["c"]) not in loaded.relations
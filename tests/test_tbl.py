@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+
+import tbl
+from M3Generator import M3Generator
+
+CONFIG = """4 1
+0 units int -1 {} 0
+1 ksn int -1 {} 0
+2 locn double -1 {} 0
+3 cat string -1 {} 0
+Inventory 0 ksn,locn,units,cat
+"""
+
+
+def write_dataset(tmp_path, rows):
+    (tmp_path / "config.txt").write_text(CONFIG)
+    with open(tmp_path / "Inventory.tbl", "w") as f:
+        for row in rows:
+            f.write("|".join(map(str, row)) + "\n")
+    return M3Generator(str(tmp_path / "config.txt"), "test", "RingFactorizedRelation")
+
+
+def test_stream_columns_follow_the_config(tmp_path):
+    generator = write_dataset(tmp_path, [])
+    source = generator.relations[0].generate_source("test")
+    assert "CREATE STREAM Inventory (ksn int,locn double,units int,cat string)" in source
+
+
+def test_load_table_parses_columns_in_config_order(tmp_path):
+    generator = write_dataset(tmp_path, [(i, i / 2, i * 10, f"c{i}") for i in range(100)])
+    ksn, locn, units, cat = tbl.load_table(str(tmp_path), generator.relations[0], chunk_size=64)
+    assert ksn.dtype == np.int64 and list(ksn) == list(range(100))
+    assert locn.dtype == np.float64 and locn[7] == 3.5
+    assert list(units[:3]) == [0, 10, 20]
+    assert cat[99] == b"c99"
+
+
+def test_npy_cache_is_reused_and_invalidated(tmp_path):
+    generator = write_dataset(tmp_path, [(i, 0.5, i, "x") for i in range(10)])
+    relation = generator.relations[0]
+    tbl.load_table(str(tmp_path), relation)
+    meta = tmp_path / tbl.NPY_DIR / "Inventory" / "meta.json"
+    written = meta.stat().st_mtime_ns
+    reloaded = tbl.load_table(str(tmp_path), relation)
+    assert meta.stat().st_mtime_ns == written
+    assert isinstance(reloaded[0], np.memmap) and list(reloaded[0]) == list(range(10))
+
+    write_dataset(tmp_path, [(i, 0.5, i, "x") for i in range(20, 25)])
+    table = tmp_path / "Inventory.tbl"
+    os.utime(table, ns=(table.stat().st_atime_ns, table.stat().st_mtime_ns + 10 ** 9))
+    changed = tbl.load_table(str(tmp_path), relation)
+    assert list(changed[0]) == list(range(20, 25))
+
+
+def test_load_dataset_skips_missing_tables(tmp_path):
+    generator = write_dataset(tmp_path, [(1, 1.0, 1, "a")])
+    os.remove(tmp_path / "Inventory.tbl")
+    assert tbl.load_dataset(generator, str(tmp_path)) == {}
+
+
+def test_distinct_counts_are_exact_below_the_limit():
+    summary = tbl.TableSummary()
+    summary.add_rows(b"".join(b"%d|%d|x\n" % (i, i % 7) for i in range(1000)))
+    stats = summary.statistics("R")
+    assert stats.row_count == 1000
+    assert stats.distinct_counts == [1000, 7, 1]
+
+
+def test_merged_chunks_switch_to_the_sketch(monkeypatch):
+    monkeypatch.setattr(tbl, "EXACT_DISTINCT_LIMIT", 100)
+    first, second = tbl.TableSummary(), tbl.TableSummary()
+    first.add_rows(b"".join(b"%d\n" % i for i in range(80)))
+    second.add_rows(b"".join(b"%d\n" % i for i in range(60, 140)))
+    assert first.distinct[0].hashes is not None and second.distinct[0].hashes is not None
+    first.merge(second)
+    assert first.distinct[0].hashes is None
+    estimate = first.statistics("R").distinct_counts[0]
+    assert 140 * 0.9 <= estimate <= 140 * 1.1
+    assert estimate <= first.row_count
+
+
+def test_sketch_estimate_is_clamped_to_the_row_count(monkeypatch):
+    monkeypatch.setattr(tbl, "EXACT_DISTINCT_LIMIT", 0)
+    summary = tbl.TableSummary()
+    summary.add_rows(b"".join(b"%d\n" % i for i in range(5)))
+    assert summary.distinct[0].hashes is None
+    summary.distinct[0].registers = bytearray([20] * (1 << tbl.HLL_BITS))
+    assert summary.distinct[0].count() > 5
+    assert summary.statistics("R").distinct_counts == [5]
+
+
+def test_heavy_hitters_of_a_skewed_column():
+    rows = [b"hot"] * 500 + [b"warm"] * 100 + [b"c%d" % i for i in range(1000)]
+    summary = tbl.TableSummary()
+    for start in range(0, len(rows), 300):
+        summary.add_rows(b"\n".join(rows[start:start + 300]) + b"\n")
+    heavy_hitters = summary.statistics("R").heavy_hitters[0]
+    assert list(heavy_hitters)[:2] == ["hot", "warm"]
+    # Misra-Gries counts are lower bounds
+    assert 0 < heavy_hitters["hot"] <= 500 and heavy_hitters["warm"] <= 100
+    assert heavy_hitters["hot"] > heavy_hitters["warm"]
+
+
+def test_catalog_is_rescanned_only_for_changed_tables(tmp_path, monkeypatch):
+    write_dataset(tmp_path, [(i, 0.5, i % 3, "x") for i in range(10)])
+    scanned = []
+    scan_table = tbl.scan_table
+
+    def counting_scan(path, name, *args, **kwargs):
+        scanned.append(name)
+        return scan_table(path, name, *args, **kwargs)
+
+    monkeypatch.setattr(tbl, "scan_table", counting_scan)
+    catalog = tbl.collect_statistics(str(tmp_path), ["Inventory"], workers=1)
+    assert scanned == ["Inventory"] and (tmp_path / tbl.CATALOG_FILE).exists()
+    assert catalog.relations["Inventory"].row_count == 10
+
+    cached = tbl.collect_statistics(str(tmp_path), ["Inventory"], workers=1)
+    assert scanned == ["Inventory"]
+    assert cached.relations["Inventory"].distinct_counts == catalog.relations["Inventory"].distinct_counts
+
+    table = tmp_path / "Inventory.tbl"
+    os.utime(table, ns=(table.stat().st_atime_ns, table.stat().st_mtime_ns + 10 ** 9))
+    tbl.collect_statistics(str(tmp_path), ["Inventory"], workers=1)
+    assert scanned == ["Inventory"] * 2
+
+    mtime_ns = table.stat().st_mtime_ns
+    write_dataset(tmp_path, [(i, 0.5, i, "x") for i in range(12)])
+    os.utime(table, ns=(table.stat().st_atime_ns, mtime_ns))
+    resized = tbl.collect_statistics(str(tmp_path), ["Inventory"], workers=1)
+    assert scanned == ["Inventory"] * 3
+    assert resized.relations["Inventory"].row_count == 12
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+import executor
+from Catalog import Catalog, RelationStatistics
+from JoinOrderNode import JoinOrderNode
+from Query import Query
+from Relation import Relation
+from benchmark import workload
+
+
+def random_data(relations: "set[Relation]", seed: int, rows: int = 200, domain: int = 4):
+    rnd = random.Random(seed)
+    return {rel.name: [[rnd.randint(0, domain - 1) for _ in range(rows)] for _ in rel.free_variables]
+            for rel in relations}
+
+
+def result(query: "Query", catalog: "Catalog|None", data):
+    query.generate_variable_order(catalog)
+    return executor.execute(JoinOrderNode.generate(query.variable_order, query), data)[0].tuples
+
+
+def variable_names(node, res):
+    res.append(node.name)
+    for child in node.children:
+        variable_names(child, res)
+    return res
+
+
+def test_catalog_order_keeps_contained_variables_below():
+    relations = {Relation("R0", list("bdcae")), Relation("R1", list("edcab")), Relation("R2", ["e"]),
+                 Relation("R3", list("aebd"))}
+    catalog = Catalog([RelationStatistics("R1", 1000, [1000] * 5)] +
+                      [RelationStatistics(name, 10 ** 6, [10 ** 6] * arity) for name, arity in [("R0", 5), ("R2", 1), ("R3", 4)]])
+    query = Query("Q", relations, set())
+    data = random_data(relations, 0)
+    with_catalog = result(query, catalog, data)
+    names = variable_names(query.variable_order, [])
+    assert len(names) == len(set(names))
+    assert with_catalog == result(query, None, data)
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_catalog_order_matches_default_order(seed):
+    rnd = random.Random(seed)
+    for query in workload(4, 3, 3, seed):
+        if not query.is_q_hierarchical():
+            # neither order keeps every variable on one path for these
+            continue
+        catalog = Catalog([RelationStatistics(rel.name, rnd.choice([10, 1000, 10 ** 6]),
+                                              [rnd.choice([2, 100, 10 ** 5]) for _ in rel.free_variables])
+                           for rel in query.relations])
+        data = random_data(query.atoms, seed, rows=30, domain=3)
+        default = result(query, None, data)
+        assert result(query, catalog, data) == default